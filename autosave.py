@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Optional
+
+from engine import Log, write_savegame
+
+
+class AutoSaver:
+    # Writes savegames on a background thread, so a slow disk never stalls the Tk event loop. A save asked for
+    # while another one is still waiting replaces it: a burst of saves within delay_ms is one write of the
+    # newest position.
+    def __init__(self, file_name, delay_ms=200):
+        self.file_name = file_name
+        self.delay_ms = delay_ms
+
+        self.condition = threading.Condition()
+        self.pending: Optional[dict] = None
+        self.pending_since = 0.0
+        self.writing = False
+        self.urgent = False
+        self.closed = False
+
+        self.saves = 0
+        self.skipped = 0
+        self.failed = 0
+        # Latency is from the first request of a burst until its position is on disk, write time is the disk part.
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.write_time = 0.0
+
+        self.thread = threading.Thread(target=self.run, name='autosave', daemon=True)
+        self.thread.start()
+
+    def request(self, doc):
+        # doc is a finished savegame dict, the caller must not change it afterwards.
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('Autosave is already closed.')
+            if self.pending is None:
+                self.pending_since = time.perf_counter()
+            else:
+                self.skipped += 1
+            self.pending = doc
+            self.condition.notify_all()
+
+    def flush(self, timeout=None) -> bool:
+        # Writes the waiting save now and blocks until it is on disk. Returns False on timeout.
+        with self.condition:
+            self.urgent = True
+            self.condition.notify_all()
+            done = self.condition.wait_for(lambda: self.pending is None and not self.writing, timeout)
+            self.urgent = False
+            return done
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+
+                # Wait for the burst to settle, unless someone waits for the write.
+                deadline = self.pending_since + self.delay_ms / 1000
+                while not (self.closed or self.urgent) and time.perf_counter() < deadline:
+                    self.condition.wait(deadline - time.perf_counter())
+
+                doc, since = self.pending, self.pending_since
+                self.pending = None
+                self.urgent = False
+                self.writing = True
+
+            started = time.perf_counter()
+            try:
+                write_savegame(self.file_name, doc)
+                ok = True
+            except OSError as e:
+                Log.err(f'Autosave to {self.file_name} failed: {e}')
+                ok = False
+            finished = time.perf_counter()
+
+            with self.condition:
+                self.writing = False
+                if ok:
+                    self.saves += 1
+                    self.latency += finished - since
+                    self.max_latency = max(self.max_latency, finished - since)
+                    self.write_time += finished - started
+                else:
+                    self.failed += 1
+                self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'saves': self.saves,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'average_latency_ms': round(self.latency / self.saves * 1000, 3) if self.saves else 0.0,
+                'max_latency_ms': round(self.max_latency * 1000, 3),
+                'average_write_ms': round(self.write_time / self.saves * 1000, 3) if self.saves else 0.0,
+            }
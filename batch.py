@@ -0,0 +1,168 @@
+import argparse
+import json
+import random
+import time
+from typing import Dict, List
+
+from movegen import KING_DIRECTIONS, STEPS, generate_moves
+from position import (BLACK_MEN_SQUARES, KING_SQUARES, KING_VALUE, MAN_VALUE, WHITE, WHITE_MEN_SQUARES,
+                      Position)
+from search import evaluate
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy is optional, evaluate_positions falls back to evaluating one position at a time.
+    np = None
+
+# Columns of the stacked positions: one 32-bit plane per side, the kings plane and the player to move.
+WHITE_PLANE, BLACK_PLANE, KINGS_PLANE, TURN = 0, 1, 2, 3
+
+# Score of one quiet move more than the opponent. Zero keeps evaluate_batch equal to search.evaluate.
+MOBILITY_WEIGHT = 0
+
+
+def stack_positions(positions: List[Position]):
+    planes = np.empty((len(positions), 4), dtype=np.uint32)
+    for row, position in enumerate(positions):
+        planes[row] = position.white, position.black, position.kings, position.turn
+    return planes
+
+
+def _byte_tables(weights):
+    # Sum of the weights of the set bits, for every byte of a bitboard and every value of that byte.
+    tables = np.zeros((4, 256), dtype=np.int32)
+    for byte in range(4):
+        for value in range(256):
+            tables[byte, value] = sum(weights[8 * byte + bit] for bit in range(8) if value >> bit & 1)
+    return tables
+
+
+def _weighted_sum(bitboards, tables):
+    # Per-square weights of a whole column of bitboards with four table lookups instead of 32 bit tests.
+    octets = np.ascontiguousarray(bitboards, dtype='<u4').view(np.uint8).reshape(-1, 4)
+    return tables[0][octets[:, 0]] + tables[1][octets[:, 1]] + tables[2][octets[:, 2]] + tables[3][octets[:, 3]]
+
+
+if np is not None:
+    WHITE_MEN_TABLES = _byte_tables(WHITE_MEN_SQUARES)
+    BLACK_MEN_TABLES = _byte_tables(BLACK_MEN_SQUARES)
+    KING_TABLES = _byte_tables(KING_SQUARES)
+    COUNT_TABLES = _byte_tables([1] * 32)
+
+
+def _popcount(bitboards):
+    # np.bitwise_count is new in NumPy 2.0.
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitboards).astype(np.int32)
+    return _weighted_sum(bitboards, COUNT_TABLES)
+
+
+def _mobility(own, own_kings, empty, forward_y):
+    # Number of quiet moves: men step forward only, kings in all four directions. Different pieces
+    # stepping in the same direction never land on the same square, so the targets can be merged.
+    count = np.zeros(len(own), dtype=np.int32)
+    for direction in KING_DIRECTIONS:
+        movers = own if direction[1] == forward_y else own_kings
+        targets = np.zeros_like(own)
+        for mask, n in STEPS[direction]:
+            sources = movers & np.uint32(mask)
+            targets |= sources << np.uint32(n) if n >= 0 else sources >> np.uint32(-n)
+        count += _popcount(targets & empty)
+    return count
+
+
+def batch_features(planes) -> Dict[str, object]:
+    # Features of all positions in one pass, every one as white's score minus black's.
+    white, black, kings = planes[:, WHITE_PLANE], planes[:, BLACK_PLANE], planes[:, KINGS_PLANE]
+    white_kings, black_kings = white & kings, black & kings
+    white_men, black_men = white & ~kings, black & ~kings
+
+    material = (MAN_VALUE * (_popcount(white_men) - _popcount(black_men))
+                + KING_VALUE * (_popcount(white_kings) - _popcount(black_kings)))
+    advancement = (_weighted_sum(white_men, WHITE_MEN_TABLES) - _weighted_sum(black_men, BLACK_MEN_TABLES)
+                   + _weighted_sum(white_kings, KING_TABLES) - _weighted_sum(black_kings, KING_TABLES))
+
+    empty = ~(white | black)
+    mobility = _mobility(white, white_kings, empty, 1) - _mobility(black, black_kings, empty, -1)
+
+    return {'material': material, 'advancement': advancement, 'mobility': mobility}
+
+
+def evaluate_batch(planes, mobility_weight=MOBILITY_WEIGHT):
+    # Same scale and point of view (side to move) as search.evaluate.
+    features = batch_features(planes)
+    score = features['material'] + features['advancement'] + mobility_weight * features['mobility']
+    return np.where(planes[:, TURN] == WHITE, score, -score)
+
+
+def evaluate_positions(positions: List[Position]) -> List[int]:
+    if np is None:
+        return [evaluate(position) for position in positions]
+    return evaluate_batch(stack_positions(positions)).tolist()
+
+
+def random_positions(doc, count, seed=0, max_plies=60) -> List[Position]:
+    # Positions from random games, for benchmarking and analysis when there is no game collection at hand.
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.from_savegame(doc)
+        for _ in range(rng.randrange(max_plies)):
+            moves = generate_moves(position, position.turn)
+            if not moves or not position.white or not position.black:
+                break
+            position.make_move(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def game_positions(doc, path) -> List[Position]:
+    # Every position of games in the book import format, see book.load_games.
+    from book import load_games
+
+    positions = []
+    for moves, _ in load_games(path):
+        position = Position.from_savegame(doc)
+        positions.append(position.copy())
+        for move in moves:
+            position.make_move(move)
+            positions.append(position.copy())
+    return positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score many positions at once and compare with one by one.')
+    parser.add_argument('--games', help='JSON file with games in the book import format')
+    parser.add_argument('--positions', type=int, default=100000, help='number of random positions without --games')
+    parser.add_argument('--savegame', default='default_savegame.json')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with open(args.savegame) as f:
+        doc = json.load(f)
+    positions = game_positions(doc, args.games) if args.games else random_positions(doc, args.positions, args.seed)
+
+    # evaluate only reads the sum the position keeps up to date, so the one by one timing scores every position
+    # from scratch, which is the work the batch does. Stacking the positions is part of the batch timing.
+    started = time.perf_counter()
+    scores = [position.compute_evaluation() * (1 if position.turn == WHITE else -1) for position in positions]
+    scalar_time = time.perf_counter() - started
+    print(f'{len(positions)} positions one by one: {scalar_time * 1000:.0f} ms')
+
+    if np is None:
+        print('NumPy is not installed, no batch evaluation.')
+        return
+
+    started = time.perf_counter()
+    planes = stack_positions(positions)
+    batch_scores = evaluate_batch(planes)
+    batch_time = time.perf_counter() - started
+    mobility = batch_features(planes)['mobility']
+    print(f'{len(positions)} positions in one batch: {batch_time * 1000:.0f} ms '
+          f'({scalar_time / batch_time:.1f}x), same scores: {batch_scores.tolist() == scores}')
+    print(f'average mobility difference for white: {mobility.mean():.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from typing import Callable, Dict, List, Optional, Tuple
+
+from engine import Board
+from perft import board_of, load_reference_positions
+
+# A benchmark slower than the baseline by more than this fraction is reported as a regression.
+DEFAULT_THRESHOLD = 0.10
+
+# Depth of the BlackAI.play benchmark, fixed instead of a time budget so the work is the same on every run.
+AI_DEPTH = 4
+
+
+def measure(function: Callable[[], object], number, repeat=5, setup: Optional[Callable[[], object]] = None) -> float:
+    # Best time of one call in microseconds. The minimum is the run least disturbed by the rest of the machine.
+    # Game code logs to stdout, which is muted so printing does not dominate the numbers.
+    times = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+            times.append(timeit.timeit(function, number=number) / number)
+    return min(times) * 1e6
+
+
+def bench_board(name, board: Board, number) -> Dict[str, float]:
+    results = {}
+
+    # The board caches the legal moves of the side to move. The plain entries empty the cache on every call, so
+    # they keep measuring move generation, the cached ones show what repeated calls in one position cost.
+    def valid_moves_cold():
+        for pawn in pawns:
+            board.invalidate_legal_moves()
+            pawn.get_valid_moves(board)
+
+    def draw_cold():
+        board.invalidate_legal_moves()
+        board.check_for_draw()
+
+    pawns = board.get_pawns_of(board.current_player)
+    if pawns:
+        results[f'get_valid_moves/{name}'] = measure(valid_moves_cold, number) / len(pawns)
+        per_call = measure(lambda: [pawn.get_valid_moves(board) for pawn in pawns], number)
+        results[f'get_valid_moves_cached/{name}'] = per_call / len(pawns)
+
+    results[f'check_for_win/{name}'] = measure(board.check_for_win, number)
+    results[f'check_for_draw/{name}'] = measure(draw_cold, number)
+    results[f'check_for_draw_cached/{name}'] = measure(board.check_for_draw, number)
+    results[f'str/{name}'] = measure(lambda: str(board), number)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'save.json')
+        results[f'save_savegame/{name}'] = measure(lambda: board.save_savegame(path), number // 10 or 1)
+        results[f'load_savegame/{name}'] = measure(lambda: board.load_savegame(path), number // 10 or 1)
+
+    return results
+
+
+def bench_ai_play(name, doc) -> Tuple[Dict[str, float], Optional[str]]:
+    # BlackAI lives in the Tk front end and needs a canvas, so this one only runs where a display is available.
+    import tkinter
+
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError as e:
+        return {}, f'BlackAI.play skipped, Tk is not available: {e}'
+
+    from main4 import BlackAI, Graphics, InteractiveBoard, Skin
+
+    try:
+        root.withdraw()
+        graphics = Graphics(tkinter.Canvas(root, width=768, height=511), Skin(ext='.gif'))
+        board = InteractiveBoard(graphics, False, False, False, None)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            board.load_savegame_doc(doc)
+        ai = BlackAI(board, graphics, me=board.current_player, time_ms=None, depth=AI_DEPTH)
+
+        # play only starts the search thread, the timing waits for the search and drops the scheduled move.
+        def play():
+            ai.play()
+            ai.wait()
+            ai.cancel()
+
+        # Every call starts with an empty transposition table, otherwise later calls only replay the first one.
+        result = measure(play, 1, setup=ai.engine.tt.clear)
+        return {f'ai_play/{name}': result}, None
+    finally:
+        root.destroy()
+
+
+def run(number) -> Tuple[Dict[str, float], List[str]]:
+    results: Dict[str, float] = {}
+    notes: List[str] = []
+
+    for entry in load_reference_positions():
+        name = entry['name'].replace(' ', '_')
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            board = board_of(entry['doc'])
+        results.update(bench_board(name, board, number))
+
+        ai_results, note = bench_ai_play(name, entry['doc'])
+        results.update(ai_results)
+        if note is not None and note not in notes:
+            notes.append(note)
+
+    return results, notes
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold) -> List[str]:
+    regressions = []
+    for name, value in sorted(results.items()):
+        if name not in baseline:
+            print(f'{name:48} {value:12.2f} us  (new)')
+            continue
+        change = value / baseline[name] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f'{name:48} {value:12.2f} us  {change:+7.1%}{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the hot paths of the game on fixed positions.')
+    parser.add_argument('--number', type=int, default=1000, help='calls per timing, fewer for the slow ones')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown that counts as a regression, 0.1 is 10 %%')
+    args = parser.parse_args()
+
+    results, notes = run(args.number)
+    for note in notes:
+        print(note)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'results_us': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results_us']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions over {args.threshold:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+    else:
+        for name, value in sorted(results.items()):
+            print(f'{name:48} {value:12.2f} us')
+
+
+if __name__ == '__main__':
+    main()
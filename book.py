@@ -0,0 +1,201 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from movegen import BitMove, generate_moves
+from position import BLACK, WHITE, Position
+
+# File layout: header followed by records sorted by zobrist key, so a probe is a binary search over the
+# memory-mapped file and every process on a host shares the same page-cached copy.
+HEADER = struct.Struct('<4sI')  # magic, number of records
+RECORD = struct.Struct('<QBBIII')  # zobrist key, from square, to square, captured mask, games, points
+KEY = struct.Struct('<Q')
+MAGIC = b'DBK1'
+
+# One game of the book: played moves from the start position and the winner's player id, 0 for a draw.
+BookGame = Tuple[List[BitMove], int]
+
+
+def aggregate_games(doc, games: Iterable[BookGame], plies=20) -> Dict[Tuple[int, BitMove], List[int]]:
+    # Collects [games, points] for every (position, move) in the first plies of the games.
+    # Points are counted in halves for the side to move: 2 for a win, 1 for a draw.
+    stats: Dict[Tuple[int, BitMove], List[int]] = {}
+
+    for moves, winner in games:
+        position = Position.from_savegame(doc)
+        for move in moves[:plies]:
+            entry = stats.setdefault((position.zobrist, move), [0, 0])
+            entry[0] += 1
+            entry[1] += 1 if winner == 0 else 2 if winner == position.turn else 0
+            position.make_move(move)
+
+    return stats
+
+
+def write_book(path, stats: Dict[Tuple[int, BitMove], List[int]], min_games=1):
+    records = sorted((key, move, games, points) for (key, move), (games, points) in stats.items()
+                     if games >= min_games)
+
+    # Written next to the target and renamed, so processes that have the old book mapped keep reading it.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        for key, (source, target, captured), games, points in records:
+            f.write(RECORD.pack(key, source, target, captured, games, points))
+    os.replace(temp_path, path)
+
+    return len(records)
+
+
+class OpeningBook:
+    def __init__(self, path, min_games=1):
+        self.path = path
+        self.min_games = min_games
+        self.hits = 0
+        self.misses = 0
+
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an opening book')
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self.mm.close()
+
+    def key_at(self, index) -> int:
+        return KEY.unpack_from(self.mm, HEADER.size + index * RECORD.size)[0]
+
+    def entries(self, key) -> List[Tuple[BitMove, int, int]]:
+        # Returns (move, games, points) of all book moves stored for the position key.
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        while low < self.size:
+            record_key, source, target, captured, games, points = RECORD.unpack_from(
+                self.mm, HEADER.size + low * RECORD.size)
+            if record_key != key:
+                break
+            entries.append(((source, target, captured), games, points))
+            low += 1
+        return entries
+
+    def probe(self, position: Position) -> Optional[BitMove]:
+        # Best scoring book move, more games break ties. Moves are checked against the legal ones,
+        # so a zobrist collision can never play an illegal move.
+        entries = [entry for entry in self.entries(position.zobrist) if entry[1] >= self.min_games]
+        if entries:
+            legal = set(generate_moves(position, position.turn))
+            entries = [entry for entry in entries if entry[0] in legal]
+
+        if not entries:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        move, _, _ = max(entries, key=lambda entry: (entry[2] / entry[1], entry[1]))
+        return move
+
+
+class BookEngine:
+    # Plays from the opening book while the position is in it, then lets the wrapped engine search.
+    def __init__(self, engine, book: OpeningBook):
+        self.engine = engine
+        self.book = book
+        self.name = engine.name
+        self.last_info = {}
+
+    def choose_move(self, position: Position) -> Optional[BitMove]:
+        move = self.book.probe(position)
+        if move is not None:
+            self.last_info = {'book': True, 'book_hits': self.book.hits}
+            return move
+
+        move = self.engine.choose_move(position)
+        self.last_info = self.engine.last_info
+        return move
+
+
+def self_play_games(doc, spec, games, workers, opening_plies, max_plies, seed) -> List[BookGame]:
+    from tournament import WIN, LOSS, play_games
+
+    book_games = []
+    for index, (score, _, _, moves) in enumerate(play_games(doc, spec, spec, games, workers, opening_plies,
+                                                             max_plies, seed)):
+        # Engine 1 plays white in even games.
+        engine1 = WHITE if index % 2 == 0 else BLACK
+        engine2 = BLACK if engine1 == WHITE else WHITE
+        winner = engine1 if score == WIN else engine2 if score == LOSS else 0
+        book_games.append((moves, winner))
+    return book_games
+
+
+def load_games(path) -> List[BookGame]:
+    # Imported games: [{"moves": [[from_square, to_square, captured_mask], ...], "winner": 0|1|2}, ...]
+    with open(path) as f:
+        return [([tuple(move) for move in game['moves']], game['winner']) for game in json.load(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or inspect an opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='build a book from self-play and imported games')
+    build.add_argument('book')
+    build.add_argument('--self-play', type=int, default=0, help='number of self-play games')
+    build.add_argument('--engine', default='alphabeta:depth=4', help='engine spec of the self-play games')
+    build.add_argument('--import', dest='imports', action='append', default=[], help='JSON file with games')
+    build.add_argument('--plies', type=int, default=16, help='how deep into the games the book goes')
+    build.add_argument('--min-games', type=int, default=2, help='leave out moves played less often')
+    build.add_argument('--opening-plies', type=int, default=4, help='random plies before the self-play engines')
+    build.add_argument('--max-plies', type=int, default=200)
+    build.add_argument('--workers', type=int, default=os.cpu_count())
+    build.add_argument('--seed', type=int, default=0)
+    build.add_argument('--savegame', default='default_savegame.json')
+
+    probe = commands.add_parser('probe', help='list book moves of a savegame position')
+    probe.add_argument('book')
+    probe.add_argument('savegame', nargs='?', default='default_savegame.json')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from tournament import parse_engine_spec
+
+        with open(args.savegame) as f:
+            doc = json.load(f)
+
+        games: List[BookGame] = []
+        for path in args.imports:
+            games.extend(load_games(path))
+        if args.self_play:
+            games.extend(self_play_games(doc, parse_engine_spec(args.engine), args.self_play, args.workers,
+                                         args.opening_plies, args.max_plies, args.seed))
+
+        stats = aggregate_games(doc, games, args.plies)
+        records = write_book(args.book, stats, args.min_games)
+        print(f'Book {args.book} written with {records} moves from {len(games)} games.')
+    else:
+        with open(args.savegame) as f:
+            position = Position.from_savegame(json.load(f))
+        book = OpeningBook(args.book)
+        for move, games, points in sorted(book.entries(position.zobrist), key=lambda e: -e[1]):
+            print(f'{move}: {games} games, score {points / 2 / games:.2f}')
+        print(f'Book move: {book.probe(position)}')
+
+
+if __name__ == '__main__':
+    main()
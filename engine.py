@@ -0,0 +1,466 @@
+import json
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+from movegen import BitMove, generate_moves
+from position import Position, Undo, coords_of, iterate_bits, square_of
+
+
+def write_savegame(file_name, doc):
+    # Writes next to the target and renames over it, so a crash leaves either the old or the new savegame,
+    # never half of one.
+    fd, temp_name = tempfile.mkstemp(prefix='.save-', suffix='.tmp', dir=os.path.dirname(os.path.abspath(file_name)))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(doc, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, file_name)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.unlink(temp_name)
+        raise
+
+
+class Player:
+    def __init__(self, player_id: int, name: str, forward_y: int):
+        self.id = player_id
+        self.name = name
+        self.forward_y = forward_y
+
+
+class Players:
+    NONE, WHITE, BLACK = Player(0, 'None', 0), Player(1, 'Blue', 1), Player(2, 'Red', -1)
+
+    @staticmethod
+    def from_id(player_id: int):
+        if player_id == 0:
+            return Players.NONE
+        elif player_id == 1:
+            return Players.WHITE
+        elif player_id == 2:
+            return Players.BLACK
+        else:
+            raise ValueError('Undefined player id')
+
+
+class Log:
+    @staticmethod
+    def debug(msg):
+        Log.log('debug', msg)
+
+    @staticmethod
+    def info(msg):
+        Log.log('info', msg)
+
+    @staticmethod
+    def err(msg):
+        Log.log('error', msg)
+
+    @staticmethod
+    def warn(msg):
+        Log.log('warn', msg)
+
+    @staticmethod
+    def log(level, msg):
+        print('[' + level + '] ' + msg)
+
+
+class Move:
+    def __init__(self, jumped_over, final_x: int, final_y: int):
+        self.jumped_over = jumped_over
+        self.final_x = final_x
+        self.final_y = final_y
+
+    def __str__(self):
+        if self.is_jump():
+            return f'Jump to {self.final_x};{self.final_y} while removing: {self.jumped_over}'
+        else:
+            return f'Move to {self.final_x};{self.final_y}'
+
+    __repr__ = __str__
+
+    def is_jump(self):
+        return len(self.jumped_over) != 0
+
+
+class Pawn:
+    def __init__(self, x: int, y: int, player: Player):
+        self.x = x
+        self.y = y
+        self.player = player
+        # Attached by the GUI layer when the pawn is shown on a canvas, the rules never touch it.
+        self.gui = None
+
+    def __str__(self):
+        return f'{self.player.name} Pawn at {self.x};{self.y}'
+
+    __repr__ = __str__
+
+    def is_draughts(self):
+        return False
+
+    def get_pawn_moves(self):
+        return [(-1, self.player.forward_y), (1, self.player.forward_y)]
+
+    # Reference per-pawn generator. Kept to cross-check the bitboard generator in movegen.
+    def get_valid_moves_from(self, x, y, pawn_moves, board, allow_only_jumps, already_jumped_over, depth) -> List[Move]:
+        valid_moves = []
+
+        if depth > 12:
+            return valid_moves
+
+        for delta_x, delta_y in pawn_moves:
+            target_position = (x + delta_x, y + delta_y)
+
+            if not board.is_valid_position(*target_position):
+                # The position was outside the playing board.
+                continue
+
+            if board.has_pawn_at(*target_position):
+                # Existing pawn is blocking this move, we cloud jump over it if it isn't our pawn.
+                # You can't jump over your own pawns. We will check if the existing pawn player is
+                # different than this player.
+                jumped_pawn = board.get_pawn_at(*target_position)
+
+                if self.player != jumped_pawn.player:
+                    # Nice! The pawn belongs to other player. We now only need valid (and free
+                    # non-obstructed) position after we jump over the other player's pawn.
+                    target_position = (target_position[0] + delta_x, target_position[1] + delta_y)
+
+                    if not board.is_valid_position(*target_position):
+                        # We can't jump this way because we would went out of board.
+                        continue
+
+                    if not board.has_pawn_at(*target_position):
+                        # The spot is free. We can jump there.
+
+                        # First try to find multi-jumps starting from end position of this jump.
+                        valid_multi_jumps = self.get_valid_moves_from(target_position[0], target_position[1],
+                                                                      pawn_moves, board, True,
+                                                                      already_jumped_over + [jumped_pawn], depth + 1)
+
+                        # We can perform single-jump only if there are no jumps following this jump.
+                        if len(valid_multi_jumps) == 0:
+                            valid_moves.append(Move(list(set(already_jumped_over + [jumped_pawn])), *target_position))
+
+                        # Add all multi-jumps to list of valid jumps.
+                        valid_moves.extend(valid_multi_jumps)
+
+            else:
+                # This is not a jump, so we should check if trivial moves are allowed.
+                if not allow_only_jumps:
+                    valid_moves.append(Move([], *target_position))
+
+        return valid_moves
+
+    def get_valid_moves(self, board) -> List[Move]:
+        square = square_of(self.x, self.y)
+        if self.player.id == board.position.turn:
+            bit_moves = [bit_move for bit_move in board.get_legal_moves() if bit_move[0] == square]
+        else:
+            bit_moves = generate_moves(board.position, self.player.id, 1 << square)
+        return [board.to_move(bit_move) for bit_move in bit_moves]
+
+    def die(self):
+        if self.gui is not None:
+            self.gui.remove_image()
+        self.x = -1
+        self.y = -1
+
+
+class Draughts(Pawn):
+    def __init__(self, x, y, player):
+        super().__init__(x, y, player)
+
+    @classmethod
+    def from_pawn(cls, from_pawn: Pawn):
+        return cls(from_pawn.x, from_pawn.y, from_pawn.player)
+
+    def __str__(self):
+        return f'{self.player.name} Draughts at {self.x};{self.y}'
+
+    __repr__ = __str__
+
+    def get_pawn_moves(self):
+        return [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+    def is_draughts(self):
+        return True
+
+
+class ScoreTracker:
+    def __init__(self):
+        self.score = {
+            Players.BLACK: 0,
+            Players.WHITE: 0
+        }
+
+    def reset(self):
+        self.score = {
+            Players.BLACK: 0,
+            Players.WHITE: 0
+        }
+
+    def get_score(self, player: Player):
+        return self.score[player]
+
+    def increment_score(self, player: Player):
+        self.score[player] = self.score[player] + 1
+
+    def decrement_score(self, player: Player):
+        self.score[player] = self.score[player] - 1
+
+
+class MoveTransaction:
+    moves = 0
+
+    def __init__(self, pawn: Pawn, board):
+        self.board = board
+        self.pawn = pawn
+        self.valid_moves = pawn.get_valid_moves(board)
+        self.undo: Optional[Undo] = None
+
+    def find_valid_move(self, x, y):
+        for move in self.valid_moves:
+            if move.final_y == y and move.final_x == x:
+                return move
+        return None
+
+    def commit(self, played_move: Move):
+        # Increment global move counter.
+        MoveTransaction.moves += 1
+
+        # Play the move on board, this also proceeds to next player.
+        self.undo = self.board.make_move(self.pawn, played_move)
+
+        # Promoted pawn was replaced by draughts.
+        _, _, _, _, promoted, _ = self.undo
+        if promoted:
+            self.pawn = None
+
+
+class Board:
+    def __init__(self):
+        self.score_tracker = ScoreTracker()
+        self.move_transaction: Optional[MoveTransaction] = None
+        # The bitboard position is the source of truth, pawn objects are kept only to drive their sprites.
+        self.position = Position(turn=Players.WHITE.id)
+        self.pawns = [[None for x in range(8)] for y in range(8)]
+        self.history: List[Undo] = []
+        # Legal moves of the side to move, generated once per position and shared by the move transaction,
+        # the AI and the draw check. Stored with the zobrist key of the position they belong to.
+        self.legal_moves: Optional[List[BitMove]] = None
+        self.legal_moves_key = 0
+
+    def __str__(self):
+        return str(self.position)
+
+    __repr__ = __str__
+
+    @property
+    def current_player(self) -> Player:
+        return Players.from_id(self.position.turn)
+
+    @current_player.setter
+    def current_player(self, player: Player):
+        self.position.set_turn(player.id)
+
+    def get_zobrist_key(self) -> int:
+        return self.position.zobrist
+
+    def get_legal_moves(self) -> List[BitMove]:
+        # The returned list is shared, callers must not change it.
+        if self.legal_moves is None or self.legal_moves_key != self.position.zobrist:
+            self.legal_moves = generate_moves(self.position, self.position.turn)
+            self.legal_moves_key = self.position.zobrist
+        return self.legal_moves
+
+    def invalidate_legal_moves(self):
+        self.legal_moves = None
+
+    def get_evaluation(self) -> int:
+        # Material and piece-square sum from white's point of view, kept up to date by every move.
+        return self.position.evaluation
+
+    def has_pawn_at(self, x, y) -> bool:
+        return self.position.piece_at(x, y) != 0
+
+    def get_pawn_at(self, x, y) -> Optional[Pawn]:
+        return self.pawns[x][y] if self.has_pawn_at(x, y) else None
+
+    def set_pawn_at(self, x, y, pawn: Optional[Pawn]):
+        if pawn is None:
+            self.position.set_piece(x, y, 0)
+        else:
+            self.position.set_piece(x, y, -pawn.player.id if pawn.is_draughts() else pawn.player.id)
+        self.pawns[x][y] = pawn
+
+    def move_pawn(self, pawn: Pawn, x, y):
+        # Only updates the pawn objects, the position is updated by make_move and unmake_move.
+        # Overridden by the GUI layer to move the sprite as well.
+        self.pawns[x][y] = pawn
+        pawn.x = x
+        pawn.y = y
+
+    def make_move(self, pawn: Pawn, move: Move) -> Undo:
+        captured = 0
+        for jumped in move.jumped_over:
+            captured |= 1 << square_of(jumped.x, jumped.y)
+
+        undo = self.position.make_move((square_of(pawn.x, pawn.y), square_of(move.final_x, move.final_y), captured))
+        _, _, _, _, promoted, _ = undo
+        self.history.append(undo)
+        self.invalidate_legal_moves()
+
+        # Move pawn on board.
+        self.pawns[pawn.x][pawn.y] = None
+        self.move_pawn(pawn, move.final_x, move.final_y)
+
+        # Remove all jumped pawns.
+        for jumped in move.jumped_over:
+            self.pawns[jumped.x][jumped.y] = None
+            self.score_tracker.increment_score(pawn.player)
+            jumped.die()
+
+        # Promote pawn to draughts.
+        if promoted:
+            self.pawns[pawn.x][pawn.y] = self.create_pawn(pawn.x, pawn.y, pawn.player, True)
+            pawn.die()
+
+        return undo
+
+    def unmake_move(self) -> Undo:
+        undo = self.history.pop()
+        source, target, captured, captured_kings, promoted, _ = undo
+        self.position.unmake_move(undo)
+        self.invalidate_legal_moves()
+
+        x, y = coords_of(source)
+        target_x, target_y = coords_of(target)
+        pawn = self.pawns[target_x][target_y]
+        self.pawns[target_x][target_y] = None
+
+        # Turn draughts back to pawn.
+        if promoted:
+            pawn.die()
+            pawn = self.create_pawn(x, y, pawn.player, False)
+        self.move_pawn(pawn, x, y)
+
+        # Bring back all jumped pawns.
+        opponent = Players.BLACK if pawn.player == Players.WHITE else Players.WHITE
+        for square in iterate_bits(captured):
+            jumped_x, jumped_y = coords_of(square)
+            self.pawns[jumped_x][jumped_y] = self.create_pawn(jumped_x, jumped_y, opponent,
+                                                               bool(captured_kings >> square & 1))
+            self.score_tracker.decrement_score(pawn.player)
+
+        return undo
+
+    def to_move(self, bit_move: BitMove) -> Move:
+        _, target, captured = bit_move
+        jumped_over = [self.pawns[x][y] for x, y in map(coords_of, iterate_bits(captured))]
+        return Move(jumped_over, *coords_of(target))
+
+    def get_all_valid_moves(self, player: Player) -> List[Tuple[Pawn, Move]]:
+        # Generates moves of all player's pawns at once using the bitboard generator.
+        moves = []
+        if player.id == self.position.turn:
+            bit_moves = self.get_legal_moves()
+        else:
+            bit_moves = generate_moves(self.position, player.id)
+        for bit_move in bit_moves:
+            x, y = coords_of(bit_move[0])
+            moves.append((self.pawns[x][y], self.to_move(bit_move)))
+        return moves
+
+    def create_pawn(self, x, y, player: Player, draughts: bool) -> Pawn:
+        # Overridden by the GUI layer to attach sprites to new pawns.
+        return Draughts(x, y, player) if draughts else Pawn(x, y, player)
+
+    # The position keeps one bitboard of pieces per player, updated by set_pawn_at, moves, jumps and promotions,
+    # so these only visit squares that hold a piece of the player.
+
+    def get_pawns_of(self, player: Player) -> List[Pawn]:
+        pawns = []
+        for square in iterate_bits(self.position.pieces(player.id)):
+            x, y = coords_of(square)
+            pawns.append(self.pawns[x][y])
+        return pawns
+
+    def get_squares_of(self, player: Player) -> List[Tuple[int, int]]:
+        return [coords_of(square) for square in iterate_bits(self.position.pieces(player.id))]
+
+    def count_pawns_of(self, player: Player) -> int:
+        return self.position.count(player.id)
+
+    def count_draughts_of(self, player: Player) -> int:
+        return (self.position.pieces(player.id) & self.position.kings).bit_count()
+
+    def load_savegame(self, file_name):
+        with open(file_name) as f:
+            # load savegame to dict
+            doc = json.load(f)
+
+        self.load_savegame_doc(doc)
+        print(f'Game loaded from {file_name}!')
+
+    def load_savegame_doc(self, doc):
+        # remove pawn objects of the previous position
+        for square in iterate_bits(self.position.occupied()):
+            x, y = coords_of(square)
+            self.pawns[x][y].die()
+            self.pawns[x][y] = None
+
+        # apply loaded state
+        self.score_tracker.reset()
+        self.position = Position.from_savegame(doc)
+        self.history = []
+        self.invalidate_legal_moves()
+
+        # rebuild pawn objects from the loaded position
+        for square in iterate_bits(self.position.occupied()):
+            x, y = coords_of(square)
+            piece = self.position.piece_at(x, y)
+            self.pawns[x][y] = self.create_pawn(x, y, Players.from_id(abs(piece)), piece < 0)
+
+    def save_savegame(self, file_name):
+        write_savegame(file_name, self.position.to_savegame())
+        print(f'Board saved to {file_name}!')
+
+    def check_for_win(self):
+        black_pawns = self.count_pawns_of(Players.BLACK)
+        white_pawns = self.count_pawns_of(Players.WHITE)
+
+        if white_pawns == 0:
+            self.show_win_screen(Players.BLACK)
+            return True
+        if black_pawns == 0:
+            self.show_win_screen(Players.WHITE)
+            return True
+        return False
+
+    def check_for_draw(self):
+        possible_moves = len(self.get_legal_moves())
+
+        Log.debug(f'Player {self.current_player.name} has {possible_moves} possible moves.')
+        if possible_moves == 0:
+            self.show_draw()
+            return True
+        return False
+
+    def show_win_screen(self, winner: Player):
+        Log.info(f'Winner: {winner.name} Score: {self.score_tracker.get_score(winner)}')
+
+    def show_draw(self):
+        Log.info(f'Draw! Player {self.current_player.name} has no moves left!')
+
+    @staticmethod
+    def should_become_draught(x, y):
+        return y == 0 or y == 7
+
+    @staticmethod
+    def is_valid_position(x, y):
+        return 8 > x >= 0 and 8 > y >= 0
+
@@ -0,0 +1,180 @@
+import argparse
+import os
+import struct
+from typing import List, Tuple
+
+from engine import Board, Players
+from movegen import BitMove
+from position import Position, Undo, coords_of
+
+# File layout: header, then records that start with their kind. A move costs 8 bytes. A snapshot of the
+# position and the score is added every snapshot_every plies, so loading and seeking replay a short tail only.
+HEADER = struct.Struct('<4sH')  # magic, snapshot every
+MAGIC = b'DJR1'
+MOVE = struct.Struct('<cBBIB')  # kind, from square, to square, captured squares, promoted
+SNAPSHOT = struct.Struct('<cIIIIBHH')  # kind, ply, white, black, kings, turn, white score, black score
+UNDO = struct.Struct('<cH')  # kind, plies taken back
+RECORDS = {b'M': MOVE, b'S': SNAPSHOT, b'U': UNDO}
+
+DEFAULT_SNAPSHOT_EVERY = 16
+
+# Position and (white, black) score at the ply of a snapshot.
+Snapshot = Tuple[Position, Tuple[int, int]]
+
+
+class Journal:
+    # Append-only record of the moves of one game. Taking moves back appends a record as well, the moves kept
+    # in memory are the line currently played. The file is flushed after every record but not synced, a crash
+    # loses at most the last moves, and a record cut in half is dropped when the journal is opened.
+    def __init__(self, path, snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.moves: List[Tuple[BitMove, bool]] = []
+        self.snapshots: List[Tuple[int, Snapshot]] = []
+        self.file = None
+
+    @classmethod
+    def create(cls, path, board: Board, snapshot_every=DEFAULT_SNAPSHOT_EVERY) -> 'Journal':
+        # Starts a new journal at the current position of the board, an existing file is replaced.
+        journal = cls(path, snapshot_every)
+        journal.file = open(path, 'wb')
+        journal.file.write(HEADER.pack(MAGIC, snapshot_every))
+        journal.write_snapshot(board)
+        journal.file.flush()
+        return journal
+
+    @classmethod
+    def open(cls, path) -> 'Journal':
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        magic, snapshot_every = HEADER.unpack_from(data, 0) if len(data) >= HEADER.size else (None, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a game journal')
+
+        journal = cls(path, snapshot_every)
+        offset = HEADER.size
+        while offset < len(data):
+            record = RECORDS.get(data[offset:offset + 1])
+            if record is None:
+                raise ValueError(f'{path} has an unknown record at byte {offset}')
+            if offset + record.size > len(data):
+                break
+            journal.read_record(record.unpack_from(data, offset))
+            offset += record.size
+
+        if not journal.snapshots:
+            raise ValueError(f'{path} has no starting position')
+
+        journal.file = open(path, 'r+b')
+        if offset < len(data):
+            # The game stopped in the middle of writing a record.
+            journal.file.truncate(offset)
+        journal.file.seek(offset)
+        return journal
+
+    def read_record(self, record):
+        kind = record[0]
+        if kind == b'M':
+            _, source, target, captured, promoted = record
+            self.moves.append(((source, target, captured), bool(promoted)))
+        elif kind == b'S':
+            _, ply, white, black, kings, turn, white_score, black_score = record
+            self.snapshots.append((ply, (Position(white, black, kings, turn), (white_score, black_score))))
+        else:
+            self.drop(record[1])
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @property
+    def ply(self):
+        return len(self.moves)
+
+    def record(self, board: Board, undo: Undo):
+        # Called after the move was played on the board, undo is what board.make_move returned.
+        source, target, captured, _, promoted, _ = undo
+        self.moves.append(((source, target, captured), promoted))
+        self.file.write(MOVE.pack(b'M', source, target, captured, promoted))
+        if self.ply % self.snapshot_every == 0:
+            self.write_snapshot(board)
+        self.file.flush()
+
+    def write_snapshot(self, board: Board):
+        position = board.position
+        scores = (board.score_tracker.get_score(Players.WHITE), board.score_tracker.get_score(Players.BLACK))
+        self.snapshots.append((self.ply, (position.copy(), scores)))
+        self.file.write(SNAPSHOT.pack(b'S', self.ply, position.white, position.black, position.kings,
+                                      position.turn, *scores))
+
+    def drop(self, plies):
+        # Forgets the last plies moves and the snapshots taken after them.
+        del self.moves[len(self.moves) - plies:]
+        while self.snapshots[-1][0] > self.ply:
+            self.snapshots.pop()
+
+    def undo(self, board: Board, plies=1):
+        # Takes the last plies moves back, on the board and in the journal.
+        plies = min(plies, self.ply)
+        if plies == 0:
+            return
+        self.drop(plies)
+        self.file.write(UNDO.pack(b'U', plies))
+        self.file.flush()
+
+        # After a restore the board only knows the moves since the snapshot it started from.
+        if len(board.history) >= plies:
+            for _ in range(plies):
+                board.unmake_move()
+        else:
+            self.restore(board)
+
+    def nearest_snapshot(self, ply) -> Tuple[int, Snapshot]:
+        for snapshot_ply, snapshot in reversed(self.snapshots):
+            if snapshot_ply <= ply:
+                return snapshot_ply, snapshot
+        raise ValueError('The journal has no starting position.')
+
+    def position_at(self, ply) -> Position:
+        # The position after ply moves, without touching any board.
+        if not 0 <= ply <= self.ply:
+            raise ValueError(f'Ply {ply} is not between 0 and {self.ply}.')
+        snapshot_ply, (position, _) = self.nearest_snapshot(ply)
+        position = position.copy()
+        for bit_move, _ in self.moves[snapshot_ply:ply]:
+            position.make_move(bit_move)
+        return position
+
+    def restore(self, board: Board, ply=None) -> Board:
+        # Sets the board to the position after ply moves (all of them by default): the nearest snapshot is
+        # loaded and the rest is replayed, so those moves can be taken back on the board.
+        ply = self.ply if ply is None else ply
+        if not 0 <= ply <= self.ply:
+            raise ValueError(f'Ply {ply} is not between 0 and {self.ply}.')
+
+        snapshot_ply, (position, (white_score, black_score)) = self.nearest_snapshot(ply)
+        board.load_savegame_doc(position.to_savegame())
+        board.score_tracker.score = {Players.WHITE: white_score, Players.BLACK: black_score}
+        for bit_move, _ in self.moves[snapshot_ply:ply]:
+            board.make_move(board.get_pawn_at(*coords_of(bit_move[0])), board.to_move(bit_move))
+        return board
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the positions of a game journal.')
+    parser.add_argument('journal')
+    parser.add_argument('--ply', type=int, help='position after this many moves, the last one by default')
+    args = parser.parse_args()
+
+    journal = Journal.open(args.journal)
+    journal.close()
+    ply = journal.ply if args.ply is None else args.ply
+    print(f'{journal.ply} moves, {len(journal.snapshots)} snapshots, {os.path.getsize(args.journal)} bytes')
+    print(f'Position after {ply} moves:')
+    print(journal.restore(Board(), ply))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,124 +1,200 @@
+import json
+import os
 import tkinter
 import random
-import json
-import math
-from typing import List, Optional
-
-
-class Player:
-    def __init__(self, player_id: int, name: str, forward_y: int):
-        self.id = player_id
-        self.name = name
-        self.forward_y = forward_y
+import threading
+import time
+from typing import Dict, List, Optional
 
+from autosave import AutoSaver
+from engine import Board, Log, Move, MoveTransaction, Pawn, Player, Players
+from journal import Journal
+from position import coords_of
+from search import create_engine
 
-class Players:
-    NONE, WHITE, BLACK = Player(0, 'None', 0), Player(1, 'Blue', 1), Player(2, 'Red', -1)
 
-    @staticmethod
-    def from_id(player_id: int):
-        if player_id == 0:
-            return Players.NONE
-        elif player_id == 1:
-            return Players.WHITE
-        elif player_id == 2:
-            return Players.BLACK
-        else:
-            raise ValueError('Undefined player id')
+# How often a running AI search is checked for its result, in milliseconds.
+AI_POLL_MS = 20
 
 
 class Skin:
-    def __init__(self, ext='.png'):
-        self.board_background = tkinter.PhotoImage(file=self.image_path(f'background{ext}'))
-
-        self.valid_move = tkinter.PhotoImage(file=self.image_path(f'valid_move{ext}'))
-        self.valid_jump = tkinter.PhotoImage(file=self.image_path(f'valid_jump{ext}'))
-
-        self.black_pawn0 = tkinter.PhotoImage(file=self.image_path(f'black_pawn0{ext}'))
-        self.black_pawn1 = tkinter.PhotoImage(file=self.image_path(f'black_pawn1{ext}'))
-        self.black_draughts0 = tkinter.PhotoImage(file=self.image_path(f'black_draughts0{ext}'))
-        self.black_draughts1 = tkinter.PhotoImage(file=self.image_path(f'black_draughts1{ext}'))
+    # Images of one skin. They are decoded on first use and kept, so starting the game only decodes what the
+    # first frame shows. Piece frames can come from one sprite sheet instead of a file each, see SkinRegistry.
+    PIECES = {Players.WHITE: 'white', Players.BLACK: 'black'}
 
-        self.white_pawn0 = tkinter.PhotoImage(file=self.image_path(f'white_pawn0{ext}'))
-        self.white_pawn1 = tkinter.PhotoImage(file=self.image_path(f'white_pawn1{ext}'))
-        self.white_draughts0 = tkinter.PhotoImage(file=self.image_path(f'white_draughts0{ext}'))
-        self.white_draughts1 = tkinter.PhotoImage(file=self.image_path(f'white_draughts1{ext}'))
-
-    @staticmethod
-    def image_path(rel):
-        return f'./images/{rel}'
+    def __init__(self, name='default', directory='./images', ext='.png', sheet=None):
+        self.name = name
+        self.directory = directory
+        self.ext = ext
+        self.sheet = sheet
+        self.sheet_image: Optional[tkinter.PhotoImage] = None
+        self.images: Dict[str, tkinter.PhotoImage] = {}
+        # Number of image files read so far.
+        self.decoded = 0
+
+    def image_path(self, rel):
+        return os.path.join(self.directory, rel)
+
+    def image(self, name) -> tkinter.PhotoImage:
+        image = self.images.get(name)
+        if image is None:
+            if self.sheet is not None and name in self.sheet['frames']:
+                image = self.cut_frame(name)
+            else:
+                image = tkinter.PhotoImage(file=self.image_path(f'{name}{self.ext}'))
+                self.decoded += 1
+            self.images[name] = image
+        return image
+
+    def cut_frame(self, name) -> tkinter.PhotoImage:
+        # The sheet is a grid of frame_size cells, frames maps a frame name to its [column, row].
+        if self.sheet_image is None:
+            self.sheet_image = tkinter.PhotoImage(file=self.image_path(self.sheet['file']))
+            self.decoded += 1
+
+        width, height = self.sheet['frame_size']
+        column, row = self.sheet['frames'][name]
+        frame = tkinter.PhotoImage(width=width, height=height)
+        frame.tk.call(frame, 'copy', self.sheet_image, '-from', column * width, row * height,
+                      (column + 1) * width, (row + 1) * height, '-to', 0, 0)
+        return frame
+
+    @property
+    def board_background(self):
+        return self.image('background')
+
+    @property
+    def valid_move(self):
+        return self.image('valid_move')
+
+    @property
+    def valid_jump(self):
+        return self.image('valid_jump')
 
     def get_image_for_pawn(self, player: Player, is_draughts: bool, animation_state: int):
-        if player == Players.WHITE:
-            if is_draughts:
-                if animation_state == 0:
-                    return self.white_draughts1
-                else:
-                    return self.white_draughts0
-            else:
-                if animation_state == 0:
-                    return self.white_pawn1
-                else:
-                    return self.white_pawn0
-        elif player == Players.BLACK:
-            if is_draughts:
-                if animation_state == 0:
-                    return self.black_draughts1
-                else:
-                    return self.black_draughts0
-            else:
-                if animation_state == 0:
-                    return self.black_pawn1
-                else:
-                    return self.black_pawn0
-        else:
+        if player not in self.PIECES:
             raise ValueError('Can\'t get image for pawn with no player.')
 
+        kind = 'draughts' if is_draughts else 'pawn'
+        frame = 1 if animation_state == 0 else 0
+        return self.image(f'{self.PIECES[player]}_{kind}{frame}')
+
+
+class SkinRegistry:
+    # Skins by name: 'default' is ./images, and every skins/<name>/skin.json adds one more. A skin.json may set
+    # "ext" and a "sheet" with the piece frames, for example
+    #   {"sheet": {"file": "pieces.png", "frame_size": [64, 64], "frames": {"white_pawn0": [0, 0], ...}}}
+    # Frames missing from the sheet, and the board and hint images, are files in the skin directory.
+    # Skins are created on first use and kept, so switching back to a skin decodes nothing again.
+    def __init__(self, ext='.png', skins_directory='./skins'):
+        self.ext = ext
+        self.definitions = {'default': {'directory': './images'}}
+        self.skins: Dict[str, Skin] = {}
+
+        if os.path.isdir(skins_directory):
+            for name in sorted(os.listdir(skins_directory)):
+                path = os.path.join(skins_directory, name, 'skin.json')
+                if not os.path.isfile(path):
+                    continue
+                with open(path) as f:
+                    definition = json.load(f)
+                definition.setdefault('directory', os.path.join(skins_directory, name))
+                self.definitions[name] = definition
+
+    def names(self) -> List[str]:
+        return list(self.definitions)
+
+    def get(self, name) -> Skin:
+        skin = self.skins.get(name)
+        if skin is None:
+            if name not in self.definitions:
+                raise ValueError(f'Unknown skin {name}, available: {", ".join(self.definitions)}')
+            definition = self.definitions[name]
+            skin = Skin(name, definition['directory'], definition.get('ext', self.ext), definition.get('sheet'))
+            self.skins[name] = skin
+        return skin
+
+
+class AnimationClock:
+    # One timer for the sprite animation of all pawns. It ticks every frame_ms and flips the sprites that are
+    # due, each pawn keeps its own flip period. Pawns leave the clock when their image is removed.
+    def __init__(self, canvas: tkinter.Canvas, frame_ms=100, report_every=0):
+        self.canvas = canvas
+        self.frame_ms = frame_ms
+        # Log the frame cost every report_every frames, 0 to stay quiet.
+        self.report_every = report_every
+        self.sprites: Dict['PawnGUI', float] = {}
+        self.timer: Optional[str] = None
+        self.paused = False
+
+        self.frames = 0
+        self.flips = 0
+        self.frame_time = 0.0
+        self.max_frame_time = 0.0
+
+    def add(self, sprite: 'PawnGUI'):
+        self.sprites[sprite] = time.perf_counter() * 1000 + sprite.animation_speed
+
+    def remove(self, sprite: 'PawnGUI'):
+        self.sprites.pop(sprite, None)
+
+    def start(self):
+        self.paused = False
+        if self.timer is None:
+            self.timer = self.canvas.after(self.frame_ms, self.tick)
+
+    def pause(self):
+        self.paused = True
+        self.cancel()
+
+    def resume(self):
+        # Sprites that became due while paused flip on the first frame.
+        self.start()
+
+    def cancel(self):
+        if self.timer is not None:
+            self.canvas.after_cancel(self.timer)
+            self.timer = None
+
+    def tick(self):
+        self.timer = None
+        started = time.perf_counter()
+        now = started * 1000
+
+        for sprite, due in self.sprites.items():
+            if now >= due:
+                sprite.animation_proceed()
+                self.sprites[sprite] = now + sprite.animation_speed
+                self.flips += 1
+
+        elapsed = time.perf_counter() - started
+        self.frames += 1
+        self.frame_time += elapsed
+        self.max_frame_time = max(self.max_frame_time, elapsed)
+        if self.report_every and self.frames % self.report_every == 0:
+            Log.debug(f'Animation: {self.stats()}')
+
+        if not self.paused:
+            self.timer = self.canvas.after(self.frame_ms, self.tick)
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'sprites': len(self.sprites),
+            'flips': self.flips,
+            'average_frame_ms': round(self.frame_time / self.frames * 1000, 3) if self.frames else 0.0,
+            'max_frame_ms': round(self.max_frame_time * 1000, 3),
+        }
+
 
 class Graphics:
-    def __init__(self, canvas: tkinter.Canvas, skin: Skin):
+    def __init__(self, canvas: tkinter.Canvas, skin: Skin, animation_report_every=0,
+                 skins: Optional[SkinRegistry] = None):
         self.skin = skin
+        # Skins the player can switch to while playing, None to keep this one.
+        self.skins = skins
         self.canvas: tkinter.Canvas = canvas
-
-
-class Log:
-    @staticmethod
-    def debug(msg):
-        Log.log('debug', msg)
-
-    @staticmethod
-    def info(msg):
-        Log.log('info', msg)
-
-    @staticmethod
-    def err(msg):
-        Log.log('error', msg)
-
-    @staticmethod
-    def warn(msg):
-        Log.log('warn', msg)
-
-    @staticmethod
-    def log(level, msg):
-        print('[' + level + '] ' + msg)
-
-
-class Move:
-    def __init__(self, jumped_over, final_x: int, final_y: int):
-        self.jumped_over = jumped_over
-        self.final_x = final_x
-        self.final_y = final_y
-
-    def __str__(self):
-        if self.is_jump():
-            return f'Jump to {self.final_x};{self.final_y} while removing: {self.jumped_over}'
-        else:
-            return f'Move to {self.final_x};{self.final_y}'
-
-    __repr__ = __str__
-
-    def is_jump(self):
-        return len(self.jumped_over) != 0
+        self.animation = AnimationClock(canvas, report_every=animation_report_every)
 
 
 class PawnGUI:
@@ -136,14 +212,16 @@ class PawnGUI:
 
     def initialize_animation(self):
         self.animation_speed = random.randint(1000, 3000)
-        self.graphics.canvas.after(self.animation_speed, self.animation_proceed)
+        self.graphics.animation.add(self)
 
     def animation_proceed(self):
         self.animation_state = (self.animation_state + 1) % 2
+        self.refresh_image()
+
+    def refresh_image(self):
         next_image = self.graphics.skin.get_image_for_pawn(self.pawn.player, self.pawn.is_draughts(),
                                                            self.animation_state)
         self.graphics.canvas.itemconfig(self.image, image=next_image)
-        self.graphics.canvas.after(self.animation_speed, self.animation_proceed)
 
     def reset_image_position(self):
         self.set_image_position(self.pawn.x * 64 + 32, self.pawn.y * 64 + 32)
@@ -152,149 +230,21 @@ class PawnGUI:
         self.graphics.canvas.coords(self.image, x, y)
 
     def remove_image(self):
+        self.graphics.animation.remove(self)
         self.graphics.canvas.delete(self.image)
 
     def bring_to_front(self):
         self.graphics.canvas.tag_raise(self.image)
 
 
-class Pawn:
-    def __init__(self, x: int, y: int, player: Player, g: Graphics):
-        self.x = x
-        self.y = y
-        self.player = player
-        self.graphics = g
-        self.gui = PawnGUI(self, g)
-
-    def __str__(self):
-        return f'{self.player.name} Pawn at {self.x};{self.y}'
-
-    __repr__ = __str__
-
-    def is_draughts(self):
-        return False
-
-    def get_pawn_moves(self):
-        return [(-1, self.player.forward_y), (1, self.player.forward_y)]
-
-    def get_valid_moves_from(self, x, y, pawn_moves, board, allow_only_jumps, already_jumped_over, depth) -> List[Move]:
-        valid_moves = []
-
-        if depth > 12:
-            return valid_moves
-
-        for delta_x, delta_y in pawn_moves:
-            target_position = (x + delta_x, y + delta_y)
-
-            if not board.is_valid_position(*target_position):
-                # The position was outside the playing board.
-                continue
-
-            if board.has_pawn_at(*target_position):
-                # Existing pawn is blocking this move, we cloud jump over it if it isn't our pawn.
-                # You can't jump over your own pawns. We will check if the existing pawn player is
-                # different than this player.
-                jumped_pawn = board.get_pawn_at(*target_position)
-
-                if self.player != jumped_pawn.player:
-                    # Nice! The pawn belongs to other player. We now only need valid (and free
-                    # non-obstructed) position after we jump over the other player's pawn.
-                    target_position = (target_position[0] + delta_x, target_position[1] + delta_y)
-
-                    if not board.is_valid_position(*target_position):
-                        # We can't jump this way because we would went out of board.
-                        continue
-
-                    if not board.has_pawn_at(*target_position):
-                        # The spot is free. We can jump there.
-
-                        # First try to find multi-jumps starting from end position of this jump.
-                        valid_multi_jumps = self.get_valid_moves_from(target_position[0], target_position[1],
-                                                                      pawn_moves, board, True,
-                                                                      already_jumped_over + [jumped_pawn], depth + 1)
-
-                        # We can perform single-jump only if there are no jumps following this jump.
-                        if len(valid_multi_jumps) == 0:
-                            valid_moves.append(Move(list(set(already_jumped_over + [jumped_pawn])), *target_position))
-
-                        # Add all multi-jumps to list of valid jumps.
-                        valid_moves.extend(valid_multi_jumps)
-
-            else:
-                # This is not a jump, so we should check if trivial moves are allowed.
-                if not allow_only_jumps:
-                    valid_moves.append(Move([], *target_position))
-
-        return valid_moves
-
-    def get_valid_moves(self, board) -> List[Move]:
-        pawn_moves = self.get_pawn_moves()
-        return self.get_valid_moves_from(self.x, self.y, pawn_moves, board, False, [], 0)
-
-    def die(self):
-        self.gui.remove_image()
-        self.x = -1
-        self.y = -1
-
-
-class Draughts(Pawn):
-    def __init__(self, x, y, player, graphics):
-        super().__init__(x, y, player, graphics)
-
-    @classmethod
-    def from_pawn(cls, from_pawn: Pawn):
-        return cls(from_pawn.x, from_pawn.y, from_pawn.player, from_pawn.graphics)
-
-    def __str__(self):
-        return f'{self.player.name} Draughts at {self.x};{self.y}'
-
-    __repr__ = __str__
-
-    def get_pawn_moves(self):
-        return [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-
-    def is_draughts(self):
-        return True
-
-
-class ScoreTracker:
-    def __init__(self):
-        self.score = {
-            Players.BLACK: 0,
-            Players.WHITE: 0
-        }
-
-    def reset(self):
-        self.score = {
-            Players.BLACK: 0,
-            Players.WHITE: 0
-        }
-
-    def get_score(self, player: Player):
-        return self.score[player]
-
-    def increment_score(self, player: Player):
-        self.score[player] = self.score[player] + 1
-
-
-class MoveTransaction:
-    moves = 0
-
+class MoveTransactionGUI(MoveTransaction):
     def __init__(self, pawn: Pawn, board):
-        self.board = board
-        self.pawn = pawn
+        super().__init__(pawn, board)
         self.currently_dragging = pawn
-        self.valid_moves = pawn.get_valid_moves(board)
         if self.board.valid_moves_gui is not None:
             self.board.valid_moves_gui.show_moves(self.valid_moves)
         self.pawn.gui.bring_to_front()
 
-    def find_valid_move(self, x, y):
-        for move in self.valid_moves:
-            if move.final_y == y and move.final_x == x:
-                return move
-        return None
-
     def dragging(self, e):
         self.pawn.gui.set_image_position(e.x, e.y)
 
@@ -309,50 +259,45 @@ class MoveTransaction:
         if self.board.valid_moves_gui is not None:
             self.board.valid_moves_gui.remove_all_moves()
 
-        # Increment global move counter.
-        MoveTransaction.moves += 1
-
-        # Move pawn on board.
-        self.board.set_pawn_at(played_move.final_x, played_move.final_y, self.pawn)
-        self.board.set_pawn_at(self.pawn.x, self.pawn.y, None)
-
-        # Update internal pawn data.
-        self.pawn.x = played_move.final_x
-        self.pawn.y = played_move.final_y
-
-        # Update pawn's graphics.
-        self.pawn.gui.reset_image_position()
-
-        # Remove all jumped pawns.
-        for jumped in played_move.jumped_over:
-            self.board.set_pawn_at(jumped.x, jumped.y, None)
-            self.board.score_tracker.increment_score(self.pawn.player)
-            jumped.die()
-
-        # Promote pawn to draughts.
-        if self.board.should_become_draught(self.pawn.x, self.pawn.y):
-            self.board.set_pawn_at(self.pawn.x, self.pawn.y, Draughts.from_pawn(self.pawn))
-            self.pawn.die()
-            self.pawn = None
-
-        # Proceed to next player.
-        self.board.current_player = Players.BLACK if self.board.current_player == Players.WHITE else Players.WHITE
+        super().commit(played_move)
 
 
 class ValidMovesGUI:
-    def __init__(self, g: Graphics):
+    # Hint images are created once and then moved, shown and hidden, instead of being created and deleted
+    # on every drag. There is at most one hint per playable square, which bounds the pool.
+    def __init__(self, g: Graphics, pool_size=8):
         self.graphics = g
-        self.created_objects = []
+        self.pool: List[int] = [self.create_hint() for _ in range(pool_size)]
+        self.shown = 0
+
+    def create_hint(self) -> int:
+        # The image is set when the hint is shown, so the hint images are not decoded before the first drag.
+        return self.graphics.canvas.create_image(0, 0, state=tkinter.HIDDEN)
 
     def show_moves(self, valid_moves: List[Move]):
+        self.remove_all_moves()
+
+        # Jumps over different pawns can end on the same square, that square shows the jump hint once.
+        targets = {}
         for move in valid_moves:
-            image = self.graphics.skin.valid_jump if move.is_jump() else self.graphics.skin.valid_move
-            obj = self.graphics.canvas.create_image(move.final_x * 64 + 32, move.final_y * 64 + 32, image=image)
-            self.created_objects.append(obj)
+            target = (move.final_x, move.final_y)
+            targets[target] = targets.get(target, False) or move.is_jump()
+
+        while len(self.pool) < len(targets):
+            self.pool.append(self.create_hint())
+
+        canvas = self.graphics.canvas
+        for hint, ((x, y), is_jump) in zip(self.pool, targets.items()):
+            image = self.graphics.skin.valid_jump if is_jump else self.graphics.skin.valid_move
+            canvas.coords(hint, x * 64 + 32, y * 64 + 32)
+            canvas.itemconfig(hint, image=image, state=tkinter.NORMAL)
+            canvas.tag_raise(hint)
+        self.shown = len(targets)
 
     def remove_all_moves(self):
-        for obj in self.created_objects:
-            self.graphics.canvas.delete(obj)
+        for hint in self.pool[:self.shown]:
+            self.graphics.canvas.itemconfig(hint, state=tkinter.HIDDEN)
+        self.shown = 0
 
 
 class BoardGUI:
@@ -361,6 +306,9 @@ class BoardGUI:
         self.graphics = g
         self.background = g.canvas.create_image(256, 256, image=g.skin.board_background)
 
+    def refresh(self):
+        self.graphics.canvas.itemconfig(self.background, image=self.graphics.skin.board_background)
+
 
 class InfoboardGUI:
     def __init__(self, board, g: Graphics):
@@ -392,51 +340,93 @@ class InfoboardGUI:
 
 
 class BlackAI:
-    def __init__(self, board, g: Graphics, me=Players.BLACK, speed=10):
-        self.speed = speed
+    def __init__(self, board, g: Graphics, me=Players.BLACK, time_ms=1000, engine='alphabeta', depth=20, workers=None,
+                 book=None, tablebase=None):
+        self.time_ms = time_ms
         self.me = me
         self.board = board
         self.graphics = g
+        self.engine = create_engine(engine, depth, time_ms=time_ms, workers=workers, book=book,
+                                    tablebase=tablebase)
+        # Timer of the chosen move waiting to be played, or of the poll of a running search. None when neither.
+        self.pending_move: Optional[str] = None
+        # The search runs on this thread, so the window keeps drawing and taking input meanwhile.
+        self.search: Optional[threading.Thread] = None
 
     def try_to_play(self):
         if self.board.current_player == self.me:
             self.play()
 
     def play(self):
-        pawns = self.get_all_pawns()
-        random.shuffle(pawns)
+        # Nothing to think about without a choice, the legal moves are already known to the board.
+        legal_moves = self.board.get_legal_moves()
+        if len(legal_moves) == 0:
+            return
+        searched = self.board.position.copy()
+        if len(legal_moves) == 1:
+            print(f'[AI] {self.engine.name}: only move')
+            self.pending_move = self.graphics.canvas.after(1, lambda: self.play_searched(legal_moves[0], searched))
+            return
 
-        moves = []
+        # A cancelled search still runs to its end, the engine is free for a new one only after that.
+        if self.search is not None and self.search.is_alive():
+            self.pending_move = self.graphics.canvas.after(AI_POLL_MS, self.try_to_play)
+            return
 
-        for pawn in pawns:
-            for move in pawn.get_valid_moves(self.board):
-                score = 1
+        # Search on a copy, so the shown board is never touched while thinking.
+        result = []
 
-                if move.is_jump():
-                    score += len(move.jumped_over) * 10
+        def search():
+            try:
+                result.append(self.engine.choose_move(searched.copy()))
+            except Exception as e:
+                Log.err(f'[AI] {self.engine.name} failed: {e!r}')
 
-                moves.append((score, pawn, move))
+        self.search = threading.Thread(target=search, name='ai-search', daemon=True)
+        self.search.start()
+        self.pending_move = self.graphics.canvas.after(AI_POLL_MS, lambda: self.poll_search(result, searched))
 
-        # sort moves.
-        moves = sorted(moves, key=lambda tup: tup[0], reverse=True)
-        print('[AI] Moves:', moves)
+    def poll_search(self, result, searched):
+        if self.search.is_alive():
+            self.pending_move = self.graphics.canvas.after(AI_POLL_MS, lambda: self.poll_search(result, searched))
+            return
 
-        if len(moves) == 0:
+        self.pending_move = None
+        if len(result) == 0:
             return
+        print(f'[AI] {self.engine.name}:', self.engine.last_info)
+        self.play_searched(result[0], searched)
+
+    def play_searched(self, bit_move, searched):
+        # Events handled during the search, like taking moves back, may have changed the position the move
+        # was chosen for.
+        self.pending_move = None
+        if bit_move is None:
+            return
+        if self.board.position != searched:
+            return Log.warn('[AI] Position changed since the search, the move is dropped.')
 
         # play the best move.
-        score, pawn, move = moves[0]
-
-        # simulate thinking so players are not frustrated
-        def helper():
-            print('[AI] Best move:', move)
-            self.play_move(pawn, move)
-
-        self.graphics.canvas.after(score * random.randint(self.speed, self.speed * 9), helper)
+        x, y = coords_of(bit_move[0])
+        pawn = self.board.get_pawn_at(x, y)
+        move = self.board.to_move(bit_move)
+        print('[AI] Best move:', move)
+        self.play_move(pawn, move)
+
+    def wait(self):
+        # Blocks until the running search is done, for benchmarks and scripts without an event loop.
+        if self.search is not None:
+            self.search.join()
+
+    def cancel(self):
+        if self.pending_move is not None:
+            self.graphics.canvas.after_cancel(self.pending_move)
+            self.pending_move = None
 
     def play_move(self, pawn, move):
-        self.board.move_transaction = MoveTransaction(pawn, self.board)
+        self.board.move_transaction = MoveTransactionGUI(pawn, self.board)
         self.board.move_transaction.commit(move)
+        self.board.move_committed(self.board.move_transaction.undo)
         self.board.move_transaction = None
 
         self.board.infoboard_gui.update()
@@ -444,59 +434,59 @@ class BlackAI:
         self.board.next_round()
 
     def get_all_pawns(self) -> List[Pawn]:
-        pawns = []
-        for x in range(8):
-            for y in range(8):
-                if self.board.has_pawn_at(x, y) and self.board.get_pawn_at(x, y).player == self.me:
-                    pawns.append(self.board.get_pawn_at(x, y))
-        return pawns
-
-
-class Board:
-    def __init__(self, graphics, ai_enabled, white_ai_enabled, show_valid_moves, bot_speed):
-        self.score_tracker = ScoreTracker()
-        self.move_transaction: MoveTransaction = None
-        self.pawns = [[None for x in range(8)] for y in range(8)]
-        self.current_player = Players.WHITE
+        return self.board.get_pawns_of(self.me)
+
+
+class InteractiveBoard(Board):
+    def __init__(self, graphics, ai_enabled, white_ai_enabled, show_valid_moves, ai_time_ms, ai_engine='alphabeta',
+                 ai_depth=20, ai_workers=None, ai_book=None, ai_tablebase=None,
+                 autosaver: Optional[AutoSaver] = None):
+        super().__init__()
         self.graphics = graphics
+        self.autosaver = autosaver
+        # Journal of the moves of this game, set by Program. Needed to take moves back.
+        self.journal: Optional[Journal] = None
+        # Canvas items of the win or draw screen, removed again when moves are taken back.
+        self.overlay: List[int] = []
         self.valid_moves_gui = ValidMovesGUI(self.graphics) if show_valid_moves else None
         self.gui = BoardGUI(self, self.graphics)
-        self.ai = BlackAI(self, self.graphics, speed=bot_speed) if ai_enabled else None
-        self.ai2 = BlackAI(self, self.graphics, Players.WHITE, speed=bot_speed) if white_ai_enabled else None
+        self.ai = BlackAI(self, self.graphics, time_ms=ai_time_ms, engine=ai_engine, depth=ai_depth,
+                          workers=ai_workers, book=ai_book, tablebase=ai_tablebase) if ai_enabled else None
+        self.ai2 = BlackAI(self, self.graphics, Players.WHITE, time_ms=ai_time_ms, engine=ai_engine, depth=ai_depth,
+                           workers=ai_workers, book=ai_book, tablebase=ai_tablebase) if white_ai_enabled else None
         self.infoboard_gui = InfoboardGUI(self, self.graphics)
         self.bind_events()
+        self.graphics.animation.start()
 
-    def __str__(self):
-        s = ''
-        for y in range(8):
-            for x in range(8):
-                p = self.pawns[x][y]
-                if p is None:
-                    s += '_'
-                elif p.player == Players.WHITE:
-                    s += 'w'
-                elif p.player == Players.BLACK:
-                    s += 'b'
-                else:
-                    s += '?'
-            s += '\n'
-        return s
-
-    __repr__ = __str__
-
-    def has_pawn_at(self, x, y) -> bool:
-        return self.pawns[x][y] is not None
-
-    def get_pawn_at(self, x, y) -> Optional[Pawn]:
-        return self.pawns[x][y]
-
-    def set_pawn_at(self, x, y, pawn: Optional[Pawn]):
-        self.pawns[x][y] = pawn
+    def create_pawn(self, x, y, player: Player, draughts: bool) -> Pawn:
+        pawn = super().create_pawn(x, y, player, draughts)
+        pawn.gui = PawnGUI(pawn, self.graphics)
+        return pawn
+
+    def move_pawn(self, pawn: Pawn, x, y):
+        super().move_pawn(pawn, x, y)
+        pawn.gui.reset_image_position()
 
     def bind_events(self):
         self.graphics.canvas.bind('<Button-1>', self.start_drag)
         self.graphics.canvas.bind('<B1-Motion>', self.do_drag)
         self.graphics.canvas.bind('<ButtonRelease-1>', self.finish_drag)
+        self.graphics.canvas.bind_all('<Key-u>', self.undo_move)
+        if self.graphics.skins is not None and len(self.graphics.skins.names()) > 1:
+            self.graphics.canvas.bind_all('<Key-s>', self.next_skin)
+
+    def set_skin(self, name):
+        # Swap the images of everything on the canvas, the game goes on untouched. Hints pick up the new
+        # images the next time they are shown.
+        self.graphics.skin = self.graphics.skins.get(name)
+        self.gui.refresh()
+        for pawn_gui in self.graphics.animation.sprites:
+            pawn_gui.refresh_image()
+        Log.info(f'Skin {name}, {self.graphics.skin.decoded} images decoded.')
+
+    def next_skin(self, e=None):
+        names = self.graphics.skins.names()
+        self.set_skin(names[(names.index(self.graphics.skin.name) + 1) % len(names)])
 
     def start_drag(self, e):
         x, y = e.x // 64, e.y // 64
@@ -511,7 +501,7 @@ class Board:
             return Log.err(f'pawn at position {x};{y} is not current player\'s')
 
         # Position is valid and contains correct player's pawn. Start new move transaction.
-        self.move_transaction = MoveTransaction(self.get_pawn_at(x, y), self)
+        self.move_transaction = MoveTransactionGUI(self.get_pawn_at(x, y), self)
 
     def do_drag(self, e):
         if self.move_transaction is not None:
@@ -539,8 +529,10 @@ class Board:
             Log.info(f'Valid move played. From {self.move_transaction.pawn.x};{self.move_transaction.pawn.y} to {x};{y}'
                      + ' Committed transaction.')
             self.move_transaction.commit(played_valid_move)
+            committed = self.move_transaction.undo
         else:
             self.move_transaction.rollback()
+            committed = None
 
         self.move_transaction = None
         print(str(self))
@@ -549,106 +541,67 @@ class Board:
         if not self.check_for_win():
             self.check_for_draw()
 
-        self.save_savegame('save.json')
+        if committed is not None:
+            self.move_committed(committed)
         self.next_round()
 
+    def move_committed(self, undo):
+        if self.journal is not None:
+            self.journal.record(self, undo)
+        self.autosave()
+
+    def undo_move(self, e=None):
+        if self.journal is None or self.move_transaction is not None:
+            return
+
+        # A move the AI chose for the current position must not be played on the earlier one.
+        for ai in (self.ai, self.ai2):
+            if ai is not None:
+                ai.cancel()
+
+        # Taking back only the reply of the AI would let it play the same move again, take back both.
+        ai_players = [ai.me for ai in (self.ai, self.ai2) if ai is not None]
+        last_player = Players.WHITE if self.current_player == Players.BLACK else Players.BLACK
+        plies = min(2 if last_player in ai_players and self.current_player not in ai_players else 1, self.journal.ply)
+        if plies == 0:
+            return Log.err('no moves to take back')
+
+        self.journal.undo(self, plies)
+        MoveTransaction.moves -= plies
+        for item in self.overlay:
+            self.graphics.canvas.delete(item)
+        self.overlay = []
+        Log.info(f'Took back {plies} moves, now at ply {self.journal.ply}.')
+        print(str(self))
+        self.infoboard_gui.update()
+        self.autosave()
+
+        # The side to move may be an AI now.
+        self.next_round()
+
+    def autosave(self):
+        # The savegame dict is built here, the autosave thread only writes it.
+        if self.autosaver is not None:
+            self.autosaver.request(self.position.to_savegame())
+
     def next_round(self):
         if self.ai is not None:
             self.ai.try_to_play()
         if self.ai2 is not None:
             self.ai2.try_to_play()
 
-    def load_savegame(self, file_name):
-        with open(file_name) as f:
-            # load savegame to dict
-            doc = json.load(f)
-
-            # apply loaded state
-            self.score_tracker.reset()
-            self.current_player = Players.from_id(doc['next_player'])
-            for y in range(8):
-                for x in range(8):
-                    if doc['pawns'][y][x] != 0:
-                        if doc['pawns'][y][x] < 0:
-                            self.pawns[x][y] = Draughts(x, y, Players.from_id(abs(doc['pawns'][y][x])), self.graphics)
-                        else:
-                            self.pawns[x][y] = Pawn(x, y, Players.from_id(doc['pawns'][y][x]), self.graphics)
-            print(f'Game loaded from {file_name}!')
-
-    def save_savegame(self, file_name):
-        with open(file_name, 'w') as f:
-            doc = {'next_player': self.current_player.id, 'pawns': []}
-            for y in range(8):
-                row = []
-                for x in range(8):
-                    e: Pawn = self.pawns[x][y]
-                    if e is None:
-                        row.append(0)
-                    else:
-                        if isinstance(e, Draughts):
-                            row.append(-e.player.id)
-                        else:
-                            row.append(e.player.id)
-                doc['pawns'].append(row)
-            json.dump(doc, f)
-            print(f'Board saved to {file_name}!')
-
-    def check_for_win(self):
-        black_pawns = 0
-        white_pawns = 0
-
-        for x in range(8):
-            for y in range(8):
-                pawn = self.get_pawn_at(x, y)
-
-                if pawn is not None:
-                    if pawn.player == Players.WHITE:
-                        white_pawns += 1
-                    elif pawn.player == Players.BLACK:
-                        black_pawns += 1
-
-        if white_pawns == 0:
-            self.show_win_screen(Players.BLACK)
-            return True
-        if black_pawns == 0:
-            self.show_win_screen(Players.WHITE)
-            return True
-
-    def check_for_draw(self):
-        possible_moves = 0
-
-        for x in range(8):
-            for y in range(8):
-                pawn = self.get_pawn_at(x, y)
-
-                if pawn is not None and pawn.player == self.current_player:
-                    possible_moves += len(pawn.get_valid_moves(self))
-
-        Log.debug(f'Player {self.current_player.name} has {possible_moves} possible moves.')
-        if possible_moves == 0:
-            self.show_draw()
-
     def show_win_screen(self, winner: Player):
-        self.graphics.canvas.create_rectangle(0, 0, 800, 800, fill='#744e30')
-        self.graphics.canvas.create_text(384, 256,
-                                         text=f'Winner: {winner.name}\nScore: {self.score_tracker.get_score(winner)}',
-                                         font=('Arial', 32))
+        self.overlay.append(self.graphics.canvas.create_rectangle(0, 0, 800, 800, fill='#744e30'))
+        self.overlay.append(self.graphics.canvas.create_text(
+            384, 256, text=f'Winner: {winner.name}\nScore: {self.score_tracker.get_score(winner)}', font=('Arial', 32)))
 
     def show_draw(self):
-        self.graphics.canvas.create_rectangle(0, 0, 800, 800, fill='#744e30')
-        self.graphics.canvas.create_text(384, 256,
-                                         text=f'Draw! Player {self.current_player.name} has no moves left!\n' +
-                                              f'White score: {self.score_tracker.get_score(Players.WHITE)}\n' +
-                                              f'Black score: {self.score_tracker.get_score(Players.BLACK)}',
-                                         font=('Arial', 32))
-
-    @staticmethod
-    def should_become_draught(x, y):
-        return y == 0 or y == 7
-
-    @staticmethod
-    def is_valid_position(x, y):
-        return 8 > x >= 0 and 8 > y >= 0
+        self.overlay.append(self.graphics.canvas.create_rectangle(0, 0, 800, 800, fill='#744e30'))
+        self.overlay.append(self.graphics.canvas.create_text(
+            384, 256, text=f'Draw! Player {self.current_player.name} has no moves left!\n' +
+                           f'White score: {self.score_tracker.get_score(Players.WHITE)}\n' +
+                           f'Black score: {self.score_tracker.get_score(Players.BLACK)}',
+            font=('Arial', 32)))
 
 
 class Program:
@@ -661,8 +614,23 @@ class Program:
         # Whether to enable AI for white player.
         white_ai_enabled = False
 
-        # Bot speed.
-        bot_speed = 10
+        # How long the AI may think about one move, in milliseconds.
+        ai_time_ms = 1000
+
+        # AI engine, 'alphabeta' searches ahead, 'parallel' splits that search over ai_workers processes,
+        # 'greedy' just takes the biggest jump.
+        ai_engine = 'alphabeta'
+
+        # Number of processes of the 'parallel' engine, None uses all CPU cores.
+        ai_workers = None
+
+        # Opening book built by book.py, None to always search.
+        ai_book = None
+        # Endgame tablebase generated by tablebase.py, None to search endgames too.
+        ai_tablebase = None
+
+        # Deepest the 'alphabeta' engine searches, it usually runs out of its time first.
+        ai_depth = 20
 
         # Whether to show valid moves.
         show_valid_moves = True
@@ -673,19 +641,63 @@ class Program:
         # Whether to use GIF graphics instead of PNG ones.
         use_gif_instead_png = True
 
+        # Journal every move of the game is appended to, None to keep no journal. U takes moves back.
+        journal_file = 'game.journal'
+
+        # Store the whole position in the journal every this many moves, loading replays the moves after it.
+        journal_snapshot_every = 16
+
+        # Whether to continue the game of journal_file instead of loading new_game_load_file.
+        resume_journal = False
+
+        # File the whole position is saved to after every move, in the background. None turns autosave off,
+        # the journal already keeps the game.
+        autosave_file = None
+
+        # Saves within this many milliseconds are written once, with the newest position.
+        autosave_delay_ms = 200
+
+        # Skin to start with, 'default' or the name of a directory in ./skins. S switches to the next skin.
+        skin = 'default'
+
+        # Log the cost of animation frames every this many frames (10 per second), 0 to turn it off.
+        animation_report_every = 0
+
         # -------------- SETTINGS END -----------------
 
         c = tkinter.Canvas(width=768, height=511)
         c.configure(background='#744e30')
         c.pack()
-        custom_graphics = Graphics(c, Skin(ext=('.gif' if use_gif_instead_png else '.png')))
-
-        b = Board(custom_graphics, black_ai_enabled, white_ai_enabled, show_valid_moves, bot_speed)
-        b.load_savegame(new_game_load_file)
-        b.save_savegame('save.json')
+        skins = SkinRegistry(ext=('.gif' if use_gif_instead_png else '.png'))
+        custom_graphics = Graphics(c, skins.get(skin), animation_report_every, skins)
+
+        autosaver = AutoSaver(autosave_file, autosave_delay_ms) if autosave_file is not None else None
+
+        b = InteractiveBoard(custom_graphics, black_ai_enabled, white_ai_enabled, show_valid_moves, ai_time_ms,
+                             ai_engine, ai_depth, ai_workers, ai_book, ai_tablebase, autosaver)
+        if resume_journal and journal_file is not None and os.path.exists(journal_file):
+            b.journal = Journal.open(journal_file)
+            b.journal.restore(b)
+            MoveTransaction.moves = b.journal.ply
+            b.infoboard_gui.update()
+            print(f'Game resumed from {journal_file} at ply {b.journal.ply}!')
+        else:
+            b.load_savegame(new_game_load_file)
+            if journal_file is not None:
+                b.journal = Journal.create(journal_file, b, journal_snapshot_every)
+        b.autosave()
         print(b)
+        b.next_round()
 
         tkinter.mainloop()
 
+        if b.journal is not None:
+            b.journal.close()
+
+        if autosaver is not None:
+            autosaver.close()
+            Log.info(f'Autosave: {autosaver.stats()}')
+
 
-Program()
+if __name__ == '__main__':
+    Program()
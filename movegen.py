@@ -0,0 +1,126 @@
+from typing import Dict, List, Optional, Tuple
+
+from position import WHITE, SQUARES, Position, coords_of, is_playable, square_of
+
+# Moves are plain tuples (from_square, to_square, captured_mask), so millions of them are cheap to build.
+BitMove = Tuple[int, int, int]
+
+# Same limit as Pawn.get_valid_moves_from, kings could otherwise circle around forever.
+MAX_JUMP_DEPTH = 12
+
+KING_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+
+
+def men_directions(player_id):
+    forward_y = 1 if player_id == WHITE else -1
+    return [(-1, forward_y), (1, forward_y)]
+
+
+def shift(bb, n) -> int:
+    return bb << n if n >= 0 else bb >> -n
+
+
+def _build_tables():
+    # For every direction: groups of (source mask, shift) for one step, because the index difference
+    # of a diagonal step depends on the row parity, and per-square jump table for multi-jump expansion.
+    steps: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+    jumps: Dict[Tuple[int, int], List[Optional[Tuple[int, int]]]] = {}
+
+    for dx, dy in KING_DIRECTIONS:
+        groups: Dict[int, int] = {}
+        table: List[Optional[Tuple[int, int]]] = [None] * SQUARES
+
+        for square in range(SQUARES):
+            x, y = coords_of(square)
+            if is_playable(x + dx, y + dy):
+                n = square_of(x + dx, y + dy) - square
+                groups[n] = groups.get(n, 0) | (1 << square)
+                if is_playable(x + 2 * dx, y + 2 * dy):
+                    table[square] = (1 << square_of(x + dx, y + dy), square_of(x + 2 * dx, y + 2 * dy))
+
+        steps[(dx, dy)] = [(mask, n) for n, mask in groups.items()]
+        jumps[(dx, dy)] = table
+
+    return steps, jumps
+
+
+STEPS, JUMPS = _build_tables()
+
+# Jumping two squares along a diagonal always changes the square index by the same amount.
+JUMP_SHIFTS = {(dx, dy): 8 * dy + dx for dx, dy in KING_DIRECTIONS}
+JUMP_SOURCES = {direction: sum(1 << square for square, jump in enumerate(table) if jump is not None)
+                for direction, table in JUMPS.items()}
+
+
+def _expand_jumps(square, directions, opponent, empty, captured, depth, out: List[Tuple[int, int]]):
+    if depth > MAX_JUMP_DEPTH:
+        return
+
+    for direction in directions:
+        jump = JUMPS[direction][square]
+        if jump is None:
+            continue
+
+        jumped, target = jump
+        if opponent & jumped and empty & (1 << target):
+            # Only the longest continuation of a jump is a valid move, same as the per-pawn generator.
+            before = len(out)
+            _expand_jumps(target, directions, opponent, empty, captured | jumped, depth + 1, out)
+            if len(out) == before:
+                out.append((target, captured | jumped))
+
+
+def generate_moves(position: Position, player_id, movers=None, captures_only=False) -> List[BitMove]:
+    own = position.pieces(player_id)
+    opponent = position.occupied() & ~own
+    empty = position.empty()
+    if movers is not None:
+        own &= movers
+
+    kings = own & position.kings
+    men = own & ~position.kings
+    men_dirs = men_directions(player_id)
+
+    moves: List[BitMove] = []
+    seen = set()
+
+    for direction in KING_DIRECTIONS:
+        movers_d = kings | men if direction in men_dirs else kings
+        if not movers_d:
+            continue
+
+        jump_shift = JUMP_SHIFTS[direction]
+        jump_sources = JUMP_SOURCES[direction]
+        for mask, n in STEPS[direction]:
+            sources = movers_d & mask
+
+            # Simple moves into empty neighbours.
+            targets = shift(sources, n) & empty if not captures_only else 0
+            while targets:
+                low = targets & -targets
+                target = low.bit_length() - 1
+                moves.append((target - n, target, 0))
+                targets ^= low
+
+            # Jumps over an opponent piece into an empty square behind it.
+            landings = shift(shift(sources & jump_sources, n) & opponent, jump_shift - n) & empty
+            while landings:
+                low = landings & -landings
+                landing = low.bit_length() - 1
+                landings ^= low
+
+                source = landing - jump_shift
+                jumped = 1 << (source + n)
+                directions = KING_DIRECTIONS if kings & (1 << source) else men_dirs
+
+                continuations: List[Tuple[int, int]] = []
+                _expand_jumps(landing, directions, opponent, empty, jumped, 1, continuations)
+                if not continuations:
+                    continuations.append((landing, jumped))
+
+                for target, captured in continuations:
+                    if (source, target, captured) not in seen:
+                        seen.add((source, target, captured))
+                        moves.append((source, target, captured))
+
+    return moves
@@ -0,0 +1,81 @@
+from typing import List, Optional
+
+from movegen import BitMove
+from position import SQUARES
+
+MAX_PLY = 128
+
+# Ordering scores of the move classes, history scores stay below KILLER_SCORE.
+TT_MOVE_SCORE = 1 << 40
+CAPTURE_SCORE = 1 << 36
+KILLER_SCORE = 1 << 32
+
+
+class MoveOrderer:
+    # Orders moves so that the ones most likely to cause a cutoff are searched first:
+    # the transposition table move, captures by number of taken pawns, killer moves of the ply
+    # and then quiet moves by their history score.
+
+    def __init__(self):
+        self.killers: List[List[Optional[BitMove]]] = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * (SQUARES * SQUARES)
+
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        # Killers are only valid for the position they were found in, history is kept but made less important.
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [score >> 1 for score in self.history]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def order(self, moves: List[BitMove], tt_move: Optional[BitMove], ply) -> List[BitMove]:
+        if len(moves) < 2:
+            return moves
+
+        killer1, killer2 = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history
+
+        def score(move):
+            if move == tt_move:
+                return TT_MOVE_SCORE
+            source, target, captured = move
+            if captured:
+                return CAPTURE_SCORE + captured.bit_count()
+            if move == killer1:
+                return KILLER_SCORE + 1
+            if move == killer2:
+                return KILLER_SCORE
+            return history[source * SQUARES + target]
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    def record_cutoff(self, move: BitMove, depth, ply, move_index):
+        self.cutoffs += 1
+        if move_index == 0:
+            self.first_move_cutoffs += 1
+
+        source, target, captured = move
+        if captured:
+            # Captures are already searched early.
+            return
+
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+        self.history[source * SQUARES + target] += depth * depth
+
+    def first_move_cutoff_rate(self) -> float:
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def stats(self):
+        return {
+            'cutoffs': self.cutoffs,
+            'first_move_cutoffs': self.first_move_cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoff_rate(),
+        }
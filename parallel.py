@@ -0,0 +1,158 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from movegen import BitMove, generate_moves
+from position import Position
+from search import INFINITY, MATE_BOUND, SearchEngine, SearchTimeout
+from tablebase import Tablebase
+
+# Per-process state of pool workers, set up by _init_worker.
+_worker_engine: Optional[SearchEngine] = None
+_worker_bound = None
+
+
+def _init_worker(bound, tt_size_mb, quiescence_depth, tablebase):
+    global _worker_engine, _worker_bound
+    _worker_engine = SearchEngine(tt_size_mb=tt_size_mb, quiescence_depth=quiescence_depth,
+                                  tablebase=Tablebase(tablebase) if tablebase is not None else None)
+    _worker_bound = bound
+
+
+def _search_root_move(key, move: BitMove, depth, deadline):
+    # Searches one root move. Returns (move, score, nodes, CPU seconds), score is None when out of time.
+    engine = _worker_engine
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    engine.nodes = 0
+    engine.quiescence_nodes = 0
+    # Deadline is wall-clock time, so it means the same in every process.
+    engine.deadline = started + (deadline - time.time()) if deadline is not None else None
+
+    position = Position(*key)
+    position.make_move(move)
+
+    # Moves that can't beat the best score found so far by any worker only need to prove that.
+    alpha = _worker_bound.value
+    try:
+        score = -engine.negamax(position, depth - 1, -INFINITY, -alpha, 1)
+    except SearchTimeout:
+        score = None
+
+    if score is not None and score > alpha:
+        with _worker_bound.get_lock():
+            if score > _worker_bound.value:
+                _worker_bound.value = score
+
+    return move, score, engine.nodes, engine.quiescence_nodes, time.process_time() - cpu_started
+
+
+class ParallelSearchEngine:
+    # Splits the root moves over a pool of worker processes, each with its own SearchEngine and
+    # transposition table. Workers share the best root score so far as their alpha bound.
+    name = 'parallel'
+
+    def __init__(self, depth=6, tt_size_mb=16, time_ms=None, quiescence_depth=8, workers=None, tablebase=None):
+        self.depth = depth
+        self.time_ms = time_ms
+        self.tt_size_mb = tt_size_mb
+        self.quiescence_depth = quiescence_depth
+        self.workers = workers or os.cpu_count() or 1
+        # Path of the endgame tablebase file, opened by every worker.
+        self.tablebase = tablebase
+        self.bound = multiprocessing.Value('i', -INFINITY)
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.last_info = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        # Started on first use, so creating the engine is cheap.
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                initargs=(self.bound, self.tt_size_mb, self.quiescence_depth,
+                                                          self.tablebase))
+        return self.executor
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def choose_move(self, position: Position) -> Optional[BitMove]:
+        moves = generate_moves(position, position.turn)
+        if len(moves) <= 1:
+            self.last_info = {'depth': 0, 'workers': self.workers}
+            return moves[0] if moves else None
+
+        executor = self.get_executor()
+        started = time.perf_counter()
+        deadline = time.time() + self.time_ms / 1000 if self.time_ms is not None else None
+
+        best_move, best_score, completed_depth = moves[0], 0, 0
+        nodes, quiescence_nodes, cpu_time = 0, 0, 0.0
+        for depth in range(1, self.depth + 1):
+            self.bound.value = -INFINITY
+            futures = [executor.submit(_search_root_move, position.key(), move, depth, deadline) for move in moves]
+            results = [future.result() for future in futures]
+
+            nodes += sum(result[2] for result in results)
+            quiescence_nodes += sum(result[3] for result in results)
+            cpu_time += sum(result[4] for result in results)
+            if any(score is None for _, score, _, _, _ in results):
+                break
+
+            # Best moves of this iteration are searched (and so raise the shared bound) first in the next one.
+            scores = {move: score for move, score, _, _, _ in results}
+            moves.sort(key=lambda m: scores[m], reverse=True)
+            best_move, best_score, completed_depth = moves[0], scores[moves[0]], depth
+
+            if abs(best_score) > MATE_BOUND:
+                break
+
+        elapsed = time.perf_counter() - started
+        # Counted like SearchEngine.last_info: nodes and nps are the main search, quiescence nodes come apart.
+        self.last_info = {'depth': completed_depth, 'score': best_score, 'nodes': nodes,
+                          'quiescence_nodes': quiescence_nodes, 'workers': self.workers,
+                          'time_ms': round(elapsed * 1000), 'nps': round(nodes / elapsed) if elapsed else 0,
+                          'cores_busy': round(cpu_time / elapsed, 2) if elapsed else 0.0}
+        return best_move
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare single-process and parallel search to a fixed depth.')
+    parser.add_argument('savegame', nargs='?', default='default_savegame.json')
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with open(args.savegame) as f:
+        position = Position.from_savegame(json.load(f))
+
+    serial = SearchEngine(args.depth)
+    started = time.perf_counter()
+    serial_move = serial.choose_move(position)
+    serial_time = time.perf_counter() - started
+    print(f'serial:   {serial_move} {serial.last_info}')
+
+    with ParallelSearchEngine(args.depth, workers=args.workers) as engine:
+        # Start the pool outside of the measured time.
+        engine.get_executor().submit(os.getpid).result()
+        started = time.perf_counter()
+        parallel_move = engine.choose_move(position)
+        parallel_time = time.perf_counter() - started
+        print(f'parallel: {parallel_move} {engine.last_info}')
+
+    print(f'speedup with {args.workers} workers: {serial_time / parallel_time:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import sys
+import time
+from typing import List, Tuple
+
+from engine import Board
+from movegen import BitMove, generate_moves
+from position import Position, coords_of, square_of
+
+# Reference leaf counts shipped with the repo, checked by `python perft.py --check`.
+REFERENCE_FILE = 'perft.json'
+
+
+def perft(position: Position, depth) -> int:
+    # Number of leaf positions depth plies ahead. A side without pieces has no moves, so finished games
+    # end the line on their own.
+    moves = generate_moves(position, position.turn)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for move in moves:
+        undo = position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(undo)
+    return nodes
+
+
+def divide(position: Position, depth) -> List[Tuple[BitMove, int]]:
+    # Leaf counts per root move, to find the move where two generators disagree.
+    result = []
+    for move in generate_moves(position, position.turn):
+        undo = position.make_move(move)
+        result.append((move, perft(position, depth - 1)))
+        position.unmake_move(undo)
+    return result
+
+
+def reference_moves(board: Board) -> List[BitMove]:
+    # All moves of the side to move from the per-pawn generator, Pawn.get_valid_moves_from. It finds the same
+    # multi-jump once for every order the pieces can be jumped in, those are one move. Moves are kept as
+    # squares, because unmake_move brings jumped pawns back as new objects.
+    moves = []
+    for pawn in board.get_pawns_of(board.current_player):
+        for move in pawn.get_valid_moves_from(pawn.x, pawn.y, pawn.get_pawn_moves(), board, False, [], 0):
+            captured = 0
+            for jumped in move.jumped_over:
+                captured |= 1 << square_of(jumped.x, jumped.y)
+            bit_move = (square_of(pawn.x, pawn.y), square_of(move.final_x, move.final_y), captured)
+            if bit_move not in moves:
+                moves.append(bit_move)
+    return moves
+
+
+def perft_reference(board: Board, depth) -> int:
+    moves = reference_moves(board)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+
+    nodes = 0
+    for bit_move in moves:
+        board.make_move(board.get_pawn_at(*coords_of(bit_move[0])), board.to_move(bit_move))
+        nodes += perft_reference(board, depth - 1)
+        board.unmake_move()
+    return nodes
+
+
+def divide_reference(board: Board, depth) -> List[Tuple[BitMove, int]]:
+    result = []
+    for bit_move in reference_moves(board):
+        board.make_move(board.get_pawn_at(*coords_of(bit_move[0])), board.to_move(bit_move))
+        result.append((bit_move, perft_reference(board, depth - 1)))
+        board.unmake_move()
+    return result
+
+
+def board_of(doc) -> Board:
+    board = Board()
+    board.load_savegame_doc(doc)
+    return board
+
+
+def load_reference_positions(path=REFERENCE_FILE):
+    with open(path) as f:
+        positions = json.load(f)['positions']
+    for entry in positions:
+        if 'savegame' in entry:
+            with open(entry['savegame']) as f:
+                entry['doc'] = json.load(f)
+    return positions
+
+
+def count(doc, depth, reference) -> Tuple[int, float]:
+    started = time.perf_counter()
+    if reference:
+        nodes = perft_reference(board_of(doc), depth)
+    else:
+        nodes = perft(Position.from_savegame(doc), depth)
+    return nodes, time.perf_counter() - started
+
+
+def check(max_depth, reference) -> bool:
+    ok = True
+    total_nodes, total_time = 0, 0.0
+    for entry in load_reference_positions():
+        for depth, expected in enumerate(entry['counts'][:max_depth], start=1):
+            nodes, elapsed = count(entry['doc'], depth, reference)
+            total_nodes += nodes
+            total_time += elapsed
+            status = 'ok' if nodes == expected else f'FAILED, expected {expected}'
+            ok = ok and nodes == expected
+            print(f'{entry["name"]} depth {depth}: {nodes} {status}')
+
+    print(f'{total_nodes} nodes in {total_time:.2f} s, {total_nodes / total_time:.0f} nodes per second')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count move generator leaf nodes to a fixed depth.')
+    parser.add_argument('savegame', nargs='?', default='default_savegame.json')
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--divide', action='store_true', help='print leaf counts per root move')
+    parser.add_argument('--reference', action='store_true',
+                        help='use the per-pawn generator of engine.Pawn instead of the bitboard one')
+    parser.add_argument('--check', action='store_true', help=f'compare with the counts in {REFERENCE_FILE}')
+    args = parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check(args.depth, args.reference) else 1)
+
+    with open(args.savegame) as f:
+        doc = json.load(f)
+
+    if args.divide:
+        if args.reference:
+            moves = divide_reference(board_of(doc), args.depth)
+        else:
+            moves = divide(Position.from_savegame(doc), args.depth)
+        total = 0
+        for move, nodes in sorted(moves):
+            print(f'{move}: {nodes}')
+            total += nodes
+        print(f'total: {total}')
+        return
+
+    for depth in range(1, args.depth + 1):
+        nodes, elapsed = count(doc, depth, args.reference)
+        print(f'depth {depth}: {nodes} nodes in {elapsed:.3f} s, '
+              f'{nodes / elapsed if elapsed else 0:.0f} nodes per second')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+import random
+from typing import Iterator, List, Tuple
+
+# Only the dark squares ((x + y) is even) are playable, so a position needs just 32 bits per
+# bitmask. Squares are numbered row by row: square = y * 4 + x // 2.
+SQUARES = 32
+ALL_SQUARES = (1 << SQUARES) - 1
+
+# Same values as Player.id, so they can be used directly in savegames.
+EMPTY, WHITE, BLACK = 0, 1, 2
+
+# Rows 0 and 7, see Board.should_become_draught.
+PROMOTION_SQUARES = 0xF000000F
+
+# Undo record returned by Position.make_move:
+# (from_square, to_square, captured_mask, captured_kings_mask, promoted, previous_turn)
+Undo = Tuple[int, int, int, int, int, int]
+
+# Zobrist keys, one 64-bit number per (piece kind, square) and one for black to move. Seeded, so keys
+# are the same in every process and can be stored on disk.
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_WHITE_MEN, ZOBRIST_WHITE_KINGS, ZOBRIST_BLACK_MEN, ZOBRIST_BLACK_KINGS = [
+    [_zobrist_random.getrandbits(64) for _ in range(SQUARES)] for _ in range(4)]
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+
+MAN_VALUE = 100
+KING_VALUE = 160
+
+
+def _build_piece_square_tables():
+    white_men, black_men, kings = [], [], []
+
+    for square in range(SQUARES):
+        x, y = coords_of(square)
+        center = 4 if 2 <= x <= 5 and 2 <= y <= 5 else 0
+
+        # Men want to advance towards promotion and keep the own back row guarded as long as possible.
+        white_men.append(3 * y + center + (6 if y == 0 else 0))
+        black_men.append(3 * (7 - y) + center + (6 if y == 7 else 0))
+        kings.append(2 * center)
+
+    return white_men, black_men, kings
+
+
+def is_playable(x, y) -> bool:
+    return 8 > x >= 0 and 8 > y >= 0 and (x + y) % 2 == 0
+
+
+def square_of(x, y) -> int:
+    return y * 4 + x // 2
+
+
+def coords_of(square) -> Tuple[int, int]:
+    y = square // 4
+    return (square % 4) * 2 + y % 2, y
+
+
+def iterate_bits(bb) -> Iterator[int]:
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+WHITE_MEN_SQUARES, BLACK_MEN_SQUARES, KING_SQUARES = _build_piece_square_tables()
+
+# Material plus piece-square value of every (piece kind, square) from white's point of view, so black's are
+# negative. Position.evaluation is the sum over all pieces, kept up to date by every change of the position.
+EVAL_WHITE_MEN = [MAN_VALUE + value for value in WHITE_MEN_SQUARES]
+EVAL_WHITE_KINGS = [KING_VALUE + value for value in KING_SQUARES]
+EVAL_BLACK_MEN = [-MAN_VALUE - value for value in BLACK_MEN_SQUARES]
+EVAL_BLACK_KINGS = [-KING_VALUE - value for value in KING_SQUARES]
+
+
+def opponent_of(player_id) -> int:
+    return BLACK if player_id == WHITE else WHITE
+
+
+def zobrist_of_piece(piece, square) -> int:
+    if piece == WHITE:
+        return ZOBRIST_WHITE_MEN[square]
+    elif piece == -WHITE:
+        return ZOBRIST_WHITE_KINGS[square]
+    elif piece == BLACK:
+        return ZOBRIST_BLACK_MEN[square]
+    elif piece == -BLACK:
+        return ZOBRIST_BLACK_KINGS[square]
+    return 0
+
+
+def evaluation_of_piece(piece, square) -> int:
+    if piece == WHITE:
+        return EVAL_WHITE_MEN[square]
+    elif piece == -WHITE:
+        return EVAL_WHITE_KINGS[square]
+    elif piece == BLACK:
+        return EVAL_BLACK_MEN[square]
+    elif piece == -BLACK:
+        return EVAL_BLACK_KINGS[square]
+    return 0
+
+
+def zobrist_delta(undo: Undo, white_moved, was_king) -> int:
+    # Difference between the keys before and after the move, so make and unmake can both apply it with xor.
+    source, target, captured, captured_kings, promoted, _ = undo
+    if white_moved:
+        men, kings, opponent_men, opponent_kings = (ZOBRIST_WHITE_MEN, ZOBRIST_WHITE_KINGS,
+                                                    ZOBRIST_BLACK_MEN, ZOBRIST_BLACK_KINGS)
+    else:
+        men, kings, opponent_men, opponent_kings = (ZOBRIST_BLACK_MEN, ZOBRIST_BLACK_KINGS,
+                                                    ZOBRIST_WHITE_MEN, ZOBRIST_WHITE_KINGS)
+
+    delta = ZOBRIST_BLACK_TO_MOVE
+    delta ^= kings[source] if was_king else men[source]
+    delta ^= kings[target] if was_king or promoted else men[target]
+
+    while captured:
+        low = captured & -captured
+        square = low.bit_length() - 1
+        delta ^= opponent_kings[square] if captured_kings & low else opponent_men[square]
+        captured ^= low
+
+    return delta
+
+
+def evaluation_delta(undo: Undo, white_moved, was_king) -> int:
+    # Change of the evaluation made by the move, make adds it and unmake subtracts it.
+    source, target, captured, captured_kings, promoted, _ = undo
+    if white_moved:
+        men, kings, opponent_men, opponent_kings = EVAL_WHITE_MEN, EVAL_WHITE_KINGS, EVAL_BLACK_MEN, EVAL_BLACK_KINGS
+    else:
+        men, kings, opponent_men, opponent_kings = EVAL_BLACK_MEN, EVAL_BLACK_KINGS, EVAL_WHITE_MEN, EVAL_WHITE_KINGS
+
+    delta = (kings[target] if was_king or promoted else men[target]) - (kings[source] if was_king else men[source])
+
+    while captured:
+        low = captured & -captured
+        square = low.bit_length() - 1
+        delta -= opponent_kings[square] if captured_kings & low else opponent_men[square]
+        captured ^= low
+
+    return delta
+
+
+class Position:
+    __slots__ = ('white', 'black', 'kings', 'turn', 'zobrist', 'evaluation')
+
+    def __init__(self, white=0, black=0, kings=0, turn=WHITE, zobrist=None, evaluation=None):
+        self.white = white
+        self.black = black
+        self.kings = kings
+        self.turn = turn
+        self.zobrist = self.compute_zobrist() if zobrist is None else zobrist
+        # Material and piece-square sum from white's point of view, see search.evaluate.
+        self.evaluation = self.compute_evaluation() if evaluation is None else evaluation
+
+    def __str__(self):
+        rows = []
+        for y in range(8):
+            row = ['_'] * 8
+            for x in range(y % 2, 8, 2):
+                bit = 1 << square_of(x, y)
+                if self.white & bit:
+                    row[x] = 'w'
+                elif self.black & bit:
+                    row[x] = 'b'
+            rows.append(''.join(row))
+        return '\n'.join(rows) + '\n'
+
+    __repr__ = __str__
+
+    def __eq__(self, other):
+        return isinstance(other, Position) and self.key() == other.key()
+
+    def __hash__(self):
+        return self.zobrist
+
+    def key(self):
+        return self.white, self.black, self.kings, self.turn
+
+    def copy(self):
+        return Position(self.white, self.black, self.kings, self.turn, self.zobrist, self.evaluation)
+
+    def compute_zobrist(self) -> int:
+        # Full recomputation, the key is otherwise kept up to date incrementally.
+        zobrist = ZOBRIST_BLACK_TO_MOVE if self.turn == BLACK else 0
+        for square in iterate_bits(self.white):
+            zobrist ^= ZOBRIST_WHITE_KINGS[square] if self.kings >> square & 1 else ZOBRIST_WHITE_MEN[square]
+        for square in iterate_bits(self.black):
+            zobrist ^= ZOBRIST_BLACK_KINGS[square] if self.kings >> square & 1 else ZOBRIST_BLACK_MEN[square]
+        return zobrist
+
+    def compute_evaluation(self) -> int:
+        # Full recomputation, like the zobrist key.
+        evaluation = 0
+        for square in iterate_bits(self.white):
+            evaluation += EVAL_WHITE_KINGS[square] if self.kings >> square & 1 else EVAL_WHITE_MEN[square]
+        for square in iterate_bits(self.black):
+            evaluation += EVAL_BLACK_KINGS[square] if self.kings >> square & 1 else EVAL_BLACK_MEN[square]
+        return evaluation
+
+    def set_turn(self, player_id):
+        if (self.turn == BLACK) != (player_id == BLACK):
+            self.zobrist ^= ZOBRIST_BLACK_TO_MOVE
+        self.turn = player_id
+
+    def occupied(self) -> int:
+        return self.white | self.black
+
+    def empty(self) -> int:
+        return ALL_SQUARES & ~(self.white | self.black)
+
+    def pieces(self, player_id) -> int:
+        return self.white if player_id == WHITE else self.black
+
+    def count(self, player_id) -> int:
+        return self.pieces(player_id).bit_count()
+
+    def piece_at(self, x, y) -> int:
+        # Returns the piece in savegame notation: player id, negated for draughts.
+        if not is_playable(x, y):
+            return EMPTY
+
+        bit = 1 << square_of(x, y)
+        if self.white & bit:
+            player_id = WHITE
+        elif self.black & bit:
+            player_id = BLACK
+        else:
+            return EMPTY
+
+        return -player_id if self.kings & bit else player_id
+
+    def set_piece(self, x, y, piece):
+        if not is_playable(x, y):
+            if piece != EMPTY:
+                raise ValueError(f'{x};{y} is not a playable square')
+            return
+
+        if abs(piece) not in (EMPTY, WHITE, BLACK):
+            raise ValueError('Undefined player id')
+
+        square = square_of(x, y)
+        bit = 1 << square
+        previous = self.piece_at(x, y)
+        self.zobrist ^= zobrist_of_piece(previous, square) ^ zobrist_of_piece(piece, square)
+        self.evaluation += evaluation_of_piece(piece, square) - evaluation_of_piece(previous, square)
+        self.white &= ~bit
+        self.black &= ~bit
+        self.kings &= ~bit
+
+        if piece == EMPTY:
+            return
+        if abs(piece) == WHITE:
+            self.white |= bit
+        else:
+            self.black |= bit
+        if piece < 0:
+            self.kings |= bit
+
+    def make_move(self, move) -> Undo:
+        # Plays (from_square, to_square, captured_mask) in place and returns what is needed to take it back.
+        source, target, captured = move
+        path = (1 << source) | (1 << target)
+        captured_kings = self.kings & captured
+        was_king = self.kings >> source & 1
+        white_moved = self.white >> source & 1
+        turn = self.turn
+
+        if white_moved:
+            self.white ^= path
+            self.black &= ~captured
+        else:
+            self.black ^= path
+            self.white &= ~captured
+
+        kings = self.kings & ~captured
+        promoted = 0
+        if kings >> source & 1:
+            kings ^= path
+        elif PROMOTION_SQUARES >> target & 1:
+            kings |= 1 << target
+            promoted = 1
+        self.kings = kings
+
+        self.turn = BLACK if turn == WHITE else WHITE
+        undo = source, target, captured, captured_kings, promoted, turn
+        self.zobrist ^= zobrist_delta(undo, white_moved, was_king)
+        self.evaluation += evaluation_delta(undo, white_moved, was_king)
+        return undo
+
+    def unmake_move(self, undo: Undo):
+        source, target, captured, captured_kings, promoted, turn = undo
+        path = (1 << source) | (1 << target)
+        white_moved = self.white >> target & 1
+        was_king = self.kings >> target & 1 and not promoted
+        self.zobrist ^= zobrist_delta(undo, white_moved, was_king)
+        self.evaluation -= evaluation_delta(undo, white_moved, was_king)
+
+        if white_moved:
+            self.white ^= path
+            self.black |= captured
+        else:
+            self.black ^= path
+            self.white |= captured
+
+        kings = self.kings | captured_kings
+        if promoted:
+            kings &= ~(1 << target)
+        elif kings >> target & 1:
+            kings ^= path
+        self.kings = kings
+
+        self.turn = turn
+
+    @classmethod
+    def from_savegame(cls, doc):
+        # The zobrist key is updated by set_piece as the pieces are placed.
+        position = cls(turn=doc['next_player'])
+        for y, row in enumerate(doc['pawns']):
+            for x, piece in enumerate(row):
+                if piece != EMPTY:
+                    position.set_piece(x, y, piece)
+        return position
+
+    def to_savegame(self):
+        pawns: List[List[int]] = [[EMPTY] * 8 for _ in range(8)]
+        for square in iterate_bits(self.white | self.black):
+            x, y = coords_of(square)
+            pawns[y][x] = self.piece_at(x, y)
+        return {'next_player': self.turn, 'pawns': pawns}
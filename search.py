@@ -0,0 +1,274 @@
+import random
+import time
+from typing import Optional, Tuple
+
+from movegen import BitMove, generate_moves
+from ordering import MoveOrderer
+from position import WHITE, Position
+from tablebase import LOSS, WIN, Tablebase
+from transposition import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
+
+# Scores above this are forced wins (all opponent pieces captured), shortened by the distance in plies.
+MATE = 100000
+MATE_BOUND = MATE - 1000
+INFINITY = 1000000
+
+# How often (in nodes) the search looks at the clock.
+TIME_CHECK_NODES = 1024
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(position: Position) -> int:
+    # Material plus position, from the point of view of the side to move. The position keeps the sum up to date
+    # with every move, so this is constant time.
+    return position.evaluation if position.turn == WHITE else -position.evaluation
+
+
+def score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not to the root.
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class GreedyEngine:
+    # The original BlackAI scorer: take the move that jumps over most pawns, no lookahead.
+    name = 'greedy'
+
+    def __init__(self):
+        self.last_info = {}
+
+    def choose_move(self, position: Position) -> Optional[BitMove]:
+        moves = generate_moves(position, position.turn)
+        random.shuffle(moves)
+
+        if len(moves) == 0:
+            return None
+
+        best = max(moves, key=lambda move: 1 + move[2].bit_count() * 10)
+        self.last_info = {'moves': len(moves), 'score': 1 + best[2].bit_count() * 10}
+        return best
+
+
+class SearchEngine:
+    # Negamax with alpha-beta pruning over the bitboard position, deepened iteratively until
+    # the maximum depth or the time budget is reached.
+    name = 'alphabeta'
+
+    def __init__(self, depth=6, tt_size_mb=16, time_ms=None, quiescence_depth=8, tablebase=None):
+        self.depth = depth
+        self.time_ms = time_ms
+        self.quiescence_depth = quiescence_depth
+        # Endgame tablebase (tablebase.Tablebase) with exact results of positions with few pieces, or None.
+        self.tablebase = tablebase
+        self.tablebase_hits = 0
+        self.tt = TranspositionTable(tt_size_mb)
+        self.orderer = MoveOrderer()
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.deadline = None
+        self.last_info = {}
+
+    def choose_move(self, position: Position) -> Optional[BitMove]:
+        self.nodes = 0
+        self.quiescence_nodes = 0
+        self.tablebase_hits = 0
+        self.tt.reset_stats()
+        self.orderer.new_search()
+        started = time.perf_counter()
+        self.deadline = started + self.time_ms / 1000 if self.time_ms is not None else None
+
+        best_move, best_score, completed_depth = None, 0, 0
+        for depth in range(1, self.depth + 1):
+            try:
+                # An aborted iteration leaves its position half played, so every iteration gets a fresh copy.
+                move, score = self.search_root(position.copy(), depth)
+            except SearchTimeout:
+                break
+
+            best_move, best_score, completed_depth = move, score, depth
+
+            # There are no moves or the result is already forced, deeper search will not change anything.
+            if move is None or abs(score) > MATE_BOUND:
+                break
+
+        # Not even the first iteration finished in time, play any move rather than none.
+        if best_move is None and completed_depth == 0:
+            moves = generate_moves(position, position.turn)
+            best_move = moves[0] if len(moves) > 0 else None
+
+        elapsed = time.perf_counter() - started
+        self.last_info = {'depth': completed_depth, 'score': best_score, 'nodes': self.nodes,
+                          'quiescence_nodes': self.quiescence_nodes, 'time_ms': round(elapsed * 1000),
+                          'nps': round(self.nodes / elapsed) if elapsed else 0, 'tablebase_hits': self.tablebase_hits,
+                          **self.tt.stats(), **self.orderer.stats()}
+        return best_move
+
+    def search_root(self, position: Position, depth) -> Tuple[Optional[BitMove], int]:
+        entry = self.tt.probe(position.zobrist)
+        moves = generate_moves(position, position.turn)
+        if len(moves) == 0:
+            return None, 0
+        moves = self.orderer.order(moves, entry[4] if entry is not None else None, 0)
+
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            undo = position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move(undo)
+
+            if score > alpha:
+                alpha = score
+                best_move = move
+
+        self.tt.store(position.zobrist, depth, score_to_tt(alpha, 0), EXACT, best_move)
+        return best_move, alpha
+
+    def negamax(self, position: Position, depth, alpha, beta, ply) -> int:
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % TIME_CHECK_NODES == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        # All pieces of the side to move were jumped over, the game is lost.
+        if not position.pieces(position.turn):
+            return -MATE + ply
+
+        if self.tablebase is not None:
+            score = self.probe_tablebase(position, ply)
+            if score is not None:
+                return score
+
+        if depth <= 0:
+            return self.quiescence(position, alpha, beta, ply, self.quiescence_depth)
+
+        key = position.zobrist
+        original_alpha = alpha
+
+        entry = self.tt.probe(key)
+        if entry is not None and entry[1] >= depth:
+            _, _, tt_score, bound, _ = entry
+            tt_score = score_from_tt(tt_score, ply)
+            if bound == EXACT:
+                return tt_score
+            if bound == LOWER_BOUND:
+                alpha = max(alpha, tt_score)
+            elif bound == UPPER_BOUND:
+                beta = min(beta, tt_score)
+            if alpha >= beta:
+                return tt_score
+
+        moves = generate_moves(position, position.turn)
+
+        # The player has no moves left, which is a draw in this game.
+        if len(moves) == 0:
+            return 0
+
+        moves = self.orderer.order(moves, entry[4] if entry is not None else None, ply)
+
+        best_score = -INFINITY
+        best_move = None
+        for index, move in enumerate(moves):
+            undo = position.make_move(move)
+            score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move(undo)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.orderer.record_cutoff(move, depth, ply, index)
+                        break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(key, depth, score_to_tt(best_score, ply), bound, best_move)
+
+        return best_score
+
+    def quiescence(self, position: Position, alpha, beta, ply, depth) -> int:
+        # Extends only jumps at the leaves, so the evaluation never lands in the middle of an exchange.
+        self.quiescence_nodes += 1
+        if (self.deadline is not None and self.quiescence_nodes % TIME_CHECK_NODES == 0
+                and time.perf_counter() > self.deadline):
+            raise SearchTimeout()
+
+        if not position.pieces(position.turn):
+            return -MATE + ply
+
+        # Jumps are not mandatory, so the side to move can always settle for the static evaluation.
+        stand_pat = evaluate(position)
+        if depth <= 0 or stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        captures = generate_moves(position, position.turn, captures_only=True)
+        captures.sort(key=lambda move: move[2].bit_count(), reverse=True)
+
+        for move in captures:
+            undo = position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1, depth - 1)
+            position.unmake_move(undo)
+
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+        return alpha
+
+    def probe_tablebase(self, position: Position, ply) -> Optional[int]:
+        # Tablebase distances count plies until the loser has no pieces, which fits the mate scores of the search.
+        entry = self.tablebase.probe(position)
+        if entry is None:
+            return None
+
+        self.tablebase_hits += 1
+        result, distance = entry
+        if result == WIN:
+            return MATE - ply - distance
+        if result == LOSS:
+            return -MATE + ply + distance
+        return 0
+
+
+def create_engine(name, depth=6, tt_size_mb=16, time_ms=None, quiescence_depth=8, workers=None, book=None,
+                  tablebase=None):
+    if name == GreedyEngine.name:
+        engine = GreedyEngine()
+    elif name == SearchEngine.name:
+        engine = SearchEngine(depth, tt_size_mb, time_ms, quiescence_depth,
+                              Tablebase(tablebase) if tablebase is not None else None)
+    elif name == 'parallel':
+        from parallel import ParallelSearchEngine
+        # Every worker maps the tablebase file itself.
+        engine = ParallelSearchEngine(depth, tt_size_mb, time_ms, quiescence_depth, workers, tablebase)
+    else:
+        raise ValueError(f'Undefined engine {name}')
+
+    # Opening book file to play from before searching.
+    if book is not None:
+        from book import BookEngine, OpeningBook
+        engine = BookEngine(engine, OpeningBook(book))
+
+    return engine
@@ -0,0 +1,277 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from math import comb
+from typing import Dict, List, Optional, Tuple
+
+from movegen import generate_moves
+from position import BLACK, SQUARES, WHITE, Position
+
+# Results, from the point of view of the side to move. Stored in 2 bits per position.
+DRAW, WIN, LOSS, INVALID = 0, 1, 2, 3
+
+# Distances (plies until the loser has no pieces left) are stored in one byte and saturate here.
+MAX_DISTANCE = 255
+
+# File layout: header, then for every piece count from 2 to max_pieces the packed results
+# (4 positions per byte) followed by one distance byte per position.
+HEADER = struct.Struct('<4sI')  # magic, max pieces
+MAGIC = b'DTB1'
+
+BINOMIAL = [[comb(n, k) for k in range(SQUARES + 1)] for n in range(SQUARES + 1)]
+
+# Kinds of a piece, 2 bits each in the index.
+WHITE_MAN, WHITE_KING, BLACK_MAN, BLACK_KING = 0, 1, 2, 3
+
+# A man standing on its promotion row would already be a draughts.
+WHITE_PROMOTION_ROW = 0xF0000000
+BLACK_PROMOTION_ROW = 0x0000000F
+
+
+def positions_with(pieces) -> int:
+    # Every set of occupied squares, every kind of every piece, both sides to move.
+    return BINOMIAL[SQUARES][pieces] * 4 ** pieces * 2
+
+
+def index_of(white, black, kings, turn) -> Tuple[int, int]:
+    # Returns (piece count, index) of the position. Occupied squares are ranked in the combinatorial
+    # number system, then come the kinds of the pieces from the lowest square, then the side to move.
+    rank, kinds, pieces = 0, 0, 0
+    occupied = white | black
+    while occupied:
+        low = occupied & -occupied
+        pieces += 1
+        rank += BINOMIAL[low.bit_length() - 1][pieces]
+        kinds = kinds << 2 | (WHITE_MAN if white & low else BLACK_MAN) | (1 if kings & low else 0)
+        occupied ^= low
+
+    return pieces, ((rank << 2 * pieces | kinds) << 1) | (turn == BLACK)
+
+
+def position_at(pieces, index) -> Position:
+    turn = BLACK if index & 1 else WHITE
+    index >>= 1
+    kinds = index & ((1 << 2 * pieces) - 1)
+    rank = index >> 2 * pieces
+
+    squares = []
+    for i in range(pieces, 0, -1):
+        square = i - 1
+        while square + 1 < SQUARES and BINOMIAL[square + 1][i] <= rank:
+            square += 1
+        rank -= BINOMIAL[square][i]
+        squares.append(square)
+
+    white = black = kings = 0
+    # Squares came out highest first, which is the order of the lowest bits of kinds.
+    for square in squares:
+        kind = kinds & 3
+        kinds >>= 2
+        bit = 1 << square
+        if kind in (WHITE_MAN, WHITE_KING):
+            white |= bit
+        else:
+            black |= bit
+        if kind in (WHITE_KING, BLACK_KING):
+            kings |= bit
+
+    # The zobrist key and the evaluation are not needed here, skip computing them.
+    return Position(white, black, kings, turn, zobrist=0, evaluation=0)
+
+
+def is_valid(position: Position) -> bool:
+    if not position.white or not position.black:
+        return False
+    men = ~position.kings
+    return not (position.white & men & WHITE_PROMOTION_ROW or position.black & men & BLACK_PROMOTION_ROW)
+
+
+def _solve(pieces, tables: Dict[int, Tuple[bytearray, array]]) -> Tuple[bytearray, array]:
+    # Solves all positions with the given number of pieces. Jumps lead to fewer pieces, which are already
+    # in tables, every other move stays within this piece count. Positions are settled in order of their
+    # distance with a bucket queue over the reverse edges, whatever is never settled is a draw.
+    size = positions_with(pieces)
+    results = bytearray([INVALID]) * size
+    distances = array('H', bytes(2 * size))
+    unknown = 4
+
+    parents: List[Optional[List[int]]] = [None] * size
+    unresolved = array('I', bytes(4 * size))
+    longest_win = array('H', bytes(2 * size))
+    buckets: Dict[int, List[Tuple[int, int]]] = {}
+
+    for index in range(size):
+        position = position_at(pieces, index)
+        if not is_valid(position):
+            continue
+
+        moves = generate_moves(position, position.turn)
+        if len(moves) == 0:
+            # No moves left is a draw in this game, see Board.check_for_draw.
+            results[index] = DRAW
+            continue
+
+        results[index] = unknown
+        shortest_win = None
+        for move in moves:
+            undo = position.make_move(move)
+            child_pieces, child = index_of(position.white, position.black, position.kings, position.turn)
+
+            if child_pieces == pieces:
+                if parents[child] is None:
+                    parents[child] = []
+                parents[child].append(index)
+                unresolved[index] += 1
+            else:
+                if not position.pieces(position.turn):
+                    child_result, child_distance = LOSS, 0
+                else:
+                    child_results, child_distances = tables[child_pieces]
+                    child_result, child_distance = child_results[child], child_distances[child]
+
+                if child_result == WIN:
+                    longest_win[index] = max(longest_win[index], child_distance)
+                else:
+                    # Drawn and lost children are final, they never become a win for the opponent.
+                    unresolved[index] += 1
+                    if child_result == LOSS and (shortest_win is None or child_distance + 1 < shortest_win):
+                        shortest_win = child_distance + 1
+
+            position.unmake_move(undo)
+
+        if shortest_win is not None:
+            buckets.setdefault(shortest_win, []).append((WIN, index))
+        elif unresolved[index] == 0:
+            buckets.setdefault(longest_win[index] + 1, []).append((LOSS, index))
+
+    distance = 0
+    while buckets:
+        for result, index in buckets.pop(distance, []):
+            if results[index] != unknown:
+                continue
+            results[index] = result
+            distances[index] = distance
+
+            for parent in parents[index] or ():
+                if results[parent] != unknown:
+                    continue
+                if result == LOSS:
+                    buckets.setdefault(distance + 1, []).append((WIN, parent))
+                else:
+                    unresolved[parent] -= 1
+                    longest_win[parent] = max(longest_win[parent], distance)
+                    if unresolved[parent] == 0:
+                        buckets.setdefault(longest_win[parent] + 1, []).append((LOSS, parent))
+        distance += 1
+
+    for index in range(size):
+        if results[index] == unknown:
+            results[index] = DRAW
+
+    return results, distances
+
+
+def generate(path, max_pieces=3, verbose=True):
+    tables: Dict[int, Tuple[bytearray, array]] = {}
+
+    # Written next to the target and renamed, so processes that have the old table mapped keep reading it.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, max_pieces))
+
+        for pieces in range(2, max_pieces + 1):
+            started = time.perf_counter()
+            results, distances = _solve(pieces, tables)
+            tables[pieces] = (results, distances)
+
+            packed = bytearray((len(results) + 3) // 4)
+            for index, result in enumerate(results):
+                packed[index >> 2] |= result << 2 * (index & 3)
+            f.write(packed)
+            f.write(bytes(min(distance, MAX_DISTANCE) for distance in distances))
+
+            if verbose:
+                print(f'{pieces} pieces: {results.count(WIN)} wins, {results.count(LOSS)} losses, '
+                      f'{results.count(DRAW)} draws, {len(results)} positions '
+                      f'in {time.perf_counter() - started:.1f} s')
+
+    os.replace(temp_path, path)
+
+
+class Tablebase:
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.max_pieces = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an endgame tablebase')
+
+        # Offsets of packed results and distances for every piece count.
+        self.offsets = {}
+        offset = HEADER.size
+        for pieces in range(2, self.max_pieces + 1):
+            size = positions_with(pieces)
+            self.offsets[pieces] = (offset, offset + (size + 3) // 4)
+            offset += (size + 3) // 4 + size
+
+    def close(self):
+        self.mm.close()
+
+    def probe(self, position: Position) -> Optional[Tuple[int, int]]:
+        # Returns (result, distance in plies) for the side to move, None when the position is not covered.
+        if (position.white | position.black).bit_count() > self.max_pieces:
+            return None
+        if not position.pieces(position.turn):
+            return LOSS, 0
+
+        pieces, index = index_of(position.white, position.black, position.kings, position.turn)
+        if pieces < 2:
+            return None
+
+        results_offset, distances_offset = self.offsets[pieces]
+        result = self.mm[results_offset + (index >> 2)] >> 2 * (index & 3) & 3
+        if result == INVALID:
+            return None
+
+        self.hits += 1
+        return result, self.mm[distances_offset + index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate or probe endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='solve all positions with up to --pieces pieces')
+    generate_parser.add_argument('tablebase')
+    generate_parser.add_argument('--pieces', type=int, default=3)
+
+    probe_parser = commands.add_parser('probe', help='look up a savegame position')
+    probe_parser.add_argument('tablebase')
+    probe_parser.add_argument('savegame')
+
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate(args.tablebase, args.pieces)
+    else:
+        with open(args.savegame) as f:
+            position = Position.from_savegame(json.load(f))
+        entry = Tablebase(args.tablebase).probe(position)
+        if entry is None:
+            print('Position is not in the tablebase.')
+        else:
+            result, distance = entry
+            print(f'{("Draw", "Win", "Loss")[result]} for the side to move'
+                  + (f' in {distance} plies.' if result != DRAW else '.'))
+
+
+if __name__ == '__main__':
+    main()
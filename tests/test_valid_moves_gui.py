@@ -0,0 +1,97 @@
+import contextlib
+import io
+import random
+
+from engine import Board
+from main4 import Graphics, ValidMovesGUI
+from perft import board_of, load_reference_positions
+from position import SQUARES
+
+
+class StubCanvas:
+    # Just enough of tkinter.Canvas for ValidMovesGUI, no display needed.
+    def __init__(self):
+        self.items = {}
+        self.next_id = 0
+
+    def create_image(self, x, y, **options):
+        self.next_id += 1
+        self.items[self.next_id] = dict(options, coords=(x, y))
+        return self.next_id
+
+    def coords(self, item, x, y):
+        self.items[item]['coords'] = (x, y)
+
+    def itemconfig(self, item, **options):
+        self.items[item].update(options)
+
+    def tag_raise(self, item):
+        pass
+
+    def delete(self, item):
+        del self.items[item]
+
+    def visible(self):
+        return [options for options in self.items.values() if options.get('state') != 'hidden']
+
+
+class StubSkin:
+    valid_move = 'valid_move'
+    valid_jump = 'valid_jump'
+
+
+def boards():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield from (board_of(entry['doc']) for entry in load_reference_positions())
+
+
+def random_boards(games=20, plies=60):
+    random.seed(1)
+    for _ in range(games):
+        board = Board()
+        with contextlib.redirect_stdout(io.StringIO()):
+            board.load_savegame('default_savegame.json')
+        for _ in range(plies):
+            moves = board.get_all_valid_moves(board.current_player)
+            if not moves:
+                break
+            yield board
+            board.make_move(*random.choice(moves))
+
+
+def test_hint_items_are_reused():
+    canvas = StubCanvas()
+    hints = ValidMovesGUI(Graphics(canvas, StubSkin()), pool_size=8)
+    most_targets = 0
+
+    for board in list(boards()) + list(random_boards()):
+        for pawn in board.get_pawns_of(board.current_player):
+            moves = pawn.get_valid_moves(board)
+            hints.show_moves(moves)
+            targets = {(move.final_x, move.final_y) for move in moves}
+            assert len(canvas.visible()) == len(targets)
+            assert {options['coords'] for options in canvas.visible()} == \
+                   {(x * 64 + 32, y * 64 + 32) for x, y in targets}
+
+            hints.remove_all_moves()
+            assert canvas.visible() == []
+
+            # The pool only grows for a pawn with more targets than ever before, and never past one per square.
+            most_targets = max(most_targets, len(targets))
+            assert len(canvas.items) == max(8, most_targets)
+            assert len(canvas.items) <= SQUARES
+
+
+def test_jump_hint_wins_on_shared_target():
+    canvas = StubCanvas()
+    hints = ValidMovesGUI(Graphics(canvas, StubSkin()))
+
+    for board in boards():
+        for pawn in board.get_pawns_of(board.current_player):
+            moves = pawn.get_valid_moves(board)
+            hints.show_moves(moves)
+            jumps = {(move.final_x, move.final_y) for move in moves if move.is_jump()}
+            for options in canvas.visible():
+                x, y = options['coords']
+                assert options['image'] == ('valid_jump' if ((x - 32) // 64, (y - 32) // 64) in jumps else 'valid_move')
+            hints.remove_all_moves()
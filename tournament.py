@@ -0,0 +1,154 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from movegen import BitMove, generate_moves
+from position import BLACK, WHITE, Position
+from search import create_engine
+
+WIN, DRAW, LOSS = 1.0, 0.5, 0.0
+
+
+def parse_engine_spec(spec) -> Tuple[str, Dict[str, object]]:
+    # 'alphabeta:depth=4,book=book.bin' -> ('alphabeta', {'depth': 4, 'book': 'book.bin'})
+    name, _, options = spec.partition(':')
+    parsed = {}
+    for option in filter(None, options.split(',')):
+        key, _, value = option.partition('=')
+        parsed[key.strip()] = int(value) if value.lstrip('-').isdigit() else value
+    return name, parsed
+
+
+def random_opening(doc, plies, seed, moves: List[BitMove]) -> Position:
+    position = Position.from_savegame(doc)
+    rng = random.Random(seed)
+    for _ in range(plies):
+        valid_moves = generate_moves(position, position.turn)
+        if len(valid_moves) == 0:
+            break
+        move = rng.choice(valid_moves)
+        position.make_move(move)
+        moves.append(move)
+    return position
+
+
+def play_game(doc, spec1, spec2, engine1_white, seed, opening_plies,
+              max_plies) -> Tuple[float, int, str, List[BitMove]]:
+    # Plays one game and returns (score of engine 1, plies played, how the game ended, all played moves).
+    random.seed(seed)
+    moves: List[BitMove] = []
+    position = random_opening(doc, opening_plies, seed, moves)
+
+    engine1, engine2 = create_engine(spec1[0], **spec1[1]), create_engine(spec2[0], **spec2[1])
+    engines = {WHITE: engine1, BLACK: engine2} if engine1_white else {WHITE: engine2, BLACK: engine1}
+    engine1_side = WHITE if engine1_white else BLACK
+
+    repetitions = {position.zobrist: 1}
+    for ply in range(max_plies):
+        # Same rules as Board.check_for_win and Board.check_for_draw.
+        if not position.pieces(position.turn):
+            return (LOSS if position.turn == engine1_side else WIN), ply, 'win', moves
+
+        move = engines[position.turn].choose_move(position.copy())
+        if move is None:
+            return DRAW, ply, 'no moves', moves
+
+        position.make_move(move)
+        moves.append(move)
+
+        # Kings can shuffle forever, so a position seen three times is adjudicated as a draw.
+        repetitions[position.zobrist] = repetitions.get(position.zobrist, 0) + 1
+        if repetitions[position.zobrist] >= 3:
+            return DRAW, ply + 1, 'repetition', moves
+
+    return DRAW, max_plies, 'move limit', moves
+
+
+def _play_game_job(job):
+    return play_game(*job)
+
+
+def elo_difference(score) -> float:
+    if score <= 0.0:
+        return -math.inf
+    if score >= 1.0:
+        return math.inf
+    return round(400 * math.log10(score / (1 - score)), 1)
+
+
+def play_games(doc, spec1, spec2, games, workers=None, opening_plies=4, max_plies=200, seed=0):
+    # Games come in pairs with the same opening and swapped colors, so neither engine gets the luckier side.
+    # Engine 1 plays white in even games.
+    jobs = [(doc, spec1, spec2, game % 2 == 0, seed + game // 2, opening_plies, max_plies) for game in range(games)]
+
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(_play_game_job, jobs, chunksize=max(1, games // (8 * (workers or 1)))))
+
+
+def run_tournament(spec1, spec2, games, workers=None, opening_plies=4, max_plies=200, seed=0,
+                   savegame='default_savegame.json'):
+    with open(savegame) as f:
+        doc = json.load(f)
+
+    started = time.perf_counter()
+    results = play_games(doc, spec1, spec2, games, workers, opening_plies, max_plies, seed)
+    elapsed = time.perf_counter() - started
+
+    wins = sum(1 for score, _, _, _ in results if score == WIN)
+    draws = sum(1 for score, _, _, _ in results if score == DRAW)
+    losses = sum(1 for score, _, _, _ in results if score == LOSS)
+    score = (wins + draws / 2) / games if games else 0.0
+    endings = {}
+    for _, _, ending, _ in results:
+        endings[ending] = endings.get(ending, 0) + 1
+
+    return {
+        'engine1': spec1,
+        'engine2': spec2,
+        'games': games,
+        'wins': wins,
+        'draws': draws,
+        'losses': losses,
+        'score': score,
+        'elo': elo_difference(score),
+        'endings': endings,
+        'average_plies': sum(plies for _, plies, _, _ in results) / games if games else 0,
+        'time_s': round(elapsed, 2),
+        'games_per_second': round(games / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play two engine configurations against each other.')
+    parser.add_argument('engine1', help="engine spec, for example 'alphabeta:depth=4,time_ms=100'")
+    parser.add_argument('engine2', help="engine spec, for example 'greedy'")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--opening-plies', type=int, default=4, help='random plies played before the engines')
+    parser.add_argument('--max-plies', type=int, default=200, help='longer games are adjudicated as draws')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--savegame', default='default_savegame.json')
+    parser.add_argument('--json', action='store_true', help='print the result as JSON')
+    args = parser.parse_args()
+
+    result = run_tournament(parse_engine_spec(args.engine1), parse_engine_spec(args.engine2), args.games,
+                            args.workers, args.opening_plies, args.max_plies, args.seed, args.savegame)
+
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    print(f'{args.engine1} vs {args.engine2}: {result["games"]} games')
+    print(f'+{result["wins"]} ={result["draws"]} -{result["losses"]} '
+          f'(score {result["score"]:.3f}, Elo difference {result["elo"]:+.0f})')
+    print(f'endings: {result["endings"]}, average {result["average_plies"]:.1f} plies')
+    print(f'{result["time_s"]} s, {result["games_per_second"]} games per second')
+
+
+if __name__ == '__main__':
+    main()
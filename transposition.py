@@ -0,0 +1,93 @@
+from typing import Optional, Tuple
+
+# Kind of score stored in an entry.
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# (zobrist_key, depth, score, bound, best_move)
+Entry = Tuple[int, int, int, int, Optional[Tuple[int, int, int]]]
+
+
+class TranspositionTable:
+    # Rough CPython footprint of one filled slot: list slot, entry tuple, 64-bit key, score and best move.
+    ENTRY_BYTES = 256
+
+    def __init__(self, size_mb=16):
+        # Every bucket has two slots, so the number of buckets is rounded down to a power of two
+        # and the bucket index is just the low bits of the key.
+        buckets = max(1, int(size_mb * 1024 * 1024) // (2 * self.ENTRY_BYTES))
+        buckets = 1 << (buckets.bit_length() - 1)
+
+        self.size_mb = size_mb
+        self.mask = buckets - 1
+        self.depth_preferred = [None] * buckets
+        self.always_replace = [None] * buckets
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def __len__(self):
+        return len(self.depth_preferred) * 2
+
+    def clear(self):
+        self.depth_preferred = [None] * len(self.depth_preferred)
+        self.always_replace = [None] * len(self.always_replace)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def probe(self, key) -> Optional[Entry]:
+        index = key & self.mask
+
+        entry = self.depth_preferred[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+
+        other = self.always_replace[index]
+        if other is not None and other[0] == key:
+            self.hits += 1
+            return other
+
+        # Bucket is taken by other positions.
+        if entry is not None or other is not None:
+            self.collisions += 1
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, score, bound, best_move):
+        index = key & self.mask
+        entry = (key, depth, score, bound, best_move)
+        self.stores += 1
+
+        current = self.depth_preferred[index]
+        if current is None or current[0] == key or depth >= current[1]:
+            # Deeper (or same) searches win the depth-preferred slot, the previous owner is not thrown away
+            # but moved to the always-replace slot.
+            self.depth_preferred[index] = entry
+            if current is not None and current[0] != key:
+                self.always_replace[index] = current
+        else:
+            self.always_replace[index] = entry
+
+    def fill(self) -> float:
+        used = sum(1 for entry in self.depth_preferred if entry is not None)
+        used += sum(1 for entry in self.always_replace if entry is not None)
+        return used / len(self)
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            'size_mb': self.size_mb,
+            'entries': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'collisions': self.collisions,
+            'stores': self.stores,
+            'hit_rate': self.hits / probes if probes else 0.0,
+        }